@@ -6,27 +6,76 @@ Represents / handles all Home Assistant app specific logic
 
 from __future__ import annotations
 
+import base64
+import copy
 import json
 import os
+import posixpath
 import sys
 import tempfile
-from shutil import copyfile, copytree, rmtree
+from itertools import islice
+from shutil import copyfile, copytree, move, rmtree
+from typing import TYPE_CHECKING
 
 import click
 import crayons
 import emoji
 import semver
 import yaml
-from git import Repo
+from git import GitCommandError, Repo
 from github.Commit import Commit
-from github.GithubException import GithubException, UnknownObjectException
+from github.GithubException import UnknownObjectException
 from github.GitRelease import GitRelease
 from github.Repository import Repository
-from jinja2 import BaseLoader, Environment
 
 from repositoryupdater.github import GitHub
 
-from .const import CHANNEL_BETA, CHANNEL_EDGE
+from .archive import UnresolvedLinks
+from .const import (
+    CHANNEL_EDGE,
+    CONFIG_FILES,
+    DEFAULT_CHANGELOG_LIMIT,
+    SOURCE_ARCHIVE,
+    SOURCE_CLONE,
+    SOURCE_DELTA,
+    SOURCE_SHALLOW,
+)
+from .publisher import (
+    MODE_EXECUTABLE,
+    MODE_FILE,
+    MODE_SYMLINK,
+    ApiPublisher,
+    blob_sha,
+)
+from .sync import sync
+from .templates import is_template
+
+if TYPE_CHECKING:
+    from .resolver import ResolvedApp
+    from .state import RunState
+
+LOG_CHUNK_SIZE = 64 * 1024
+
+STATIC_FILES = (
+    "logo.png",
+    "icon.png",
+    "README.md",
+    "DOCS.md",
+    "apparmor.txt",
+    "translations",
+)
+
+
+def read_config(directory: str) -> tuple[str | None, dict | None]:
+    """Read the app configuration file in the given directory, if any."""
+    for config_file in CONFIG_FILES:
+        path = os.path.join(directory, config_file)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf8") as f:
+                return config_file, (
+                    json.load(f) if config_file.endswith(".json") else yaml.safe_load(f)
+                )
+    return None, None
 
 
 class App:
@@ -52,8 +101,14 @@ class App:
     slug: str
     url: str
     channel: str
+    source: str
     github: GitHub
-    git_repo: Repo
+    git_repo: Repo | None
+    source_dir: str
+    resolved: ResolvedApp | None
+    fingerprint: str | None
+    restored: bool
+    written: set[str]
 
     def __init__(
         self,
@@ -65,6 +120,10 @@ class App:
         app_target: str,
         channel: str,
         updating: bool,
+        resolved: ResolvedApp | None = None,
+        source: str = SOURCE_CLONE,
+        state: RunState | None = None,
+        changelog_limit: int = DEFAULT_CHANGELOG_LIMIT,
     ):
         """Initialize a new Home Assistant app object."""
         self.github = github
@@ -80,14 +139,32 @@ class App:
         self.current_version = None
         self.latest_release = None
         self.latest_commit = None
-
+        self.resolved = resolved
+        self.source = source
+        self.changelog_limit = changelog_limit
+        self.fingerprint = None
+        self.restored = False
+        self.staging_dir = None
+        self.written = set()
+        self.load(state)
+
+    def load(self, state: RunState | None = None):
+        """Load the current, and when updating the latest, app information."""
         click.echo(
             "Loading app information from: %s" % self.app_repository.html_url
         )
 
-        self.__load_current_info()
+        if state is not None:
+            self.fingerprint = self.github.fingerprint(self.app_repository)
+
+        with self.github.tracer.span("load current info", "app"):
+            self.__load_current_info(
+                state.get(self.repository_target) if state else None
+            )
         if self.updating:
-            self.__load_latest_info(channel)
+            if not self.restored:
+                with self.github.tracer.span("load latest info", "app"):
+                    self.__load_latest_info(self.channel)
             if self.needs_update(False):
                 click.echo(
                     crayons.yellow("This app has an update waiting to be published!")
@@ -95,15 +172,223 @@ class App:
             else:
                 click.echo(crayons.green("This app is up to date."))
 
-    def clone_repository(self):
+    def clone_repository(self, shallow: bool = False):
         """Clone the app source to a local working directory."""
         click.echo("Cloning app git repository...", nl=False)
-        self.git_repo = self.github.clone(
-            self.app_repository, tempfile.mkdtemp(prefix=self.app_target)
-        )
-        self.git_repo.git.checkout(self.current_commit.sha)
+        if shallow or self.source == SOURCE_SHALLOW:
+            self.git_repo = self.github.clone(
+                self.app_repository,
+                tempfile.mkdtemp(prefix=self.app_target),
+                commit=self.current_commit.sha,
+                path=self.app_target,
+            )
+        else:
+            self.git_repo = self.github.clone(
+                self.app_repository, tempfile.mkdtemp(prefix=self.app_target)
+            )
+            self.git_repo.git.checkout(self.current_commit.sha)
+        self.source_dir = os.path.join(self.git_repo.working_dir, self.app_target)
         click.echo(crayons.green("Cloned!"))
 
+    def download_archive(self):
+        """Download and extract the app source, without using git."""
+        click.echo("Downloading app source archive...", nl=False)
+        self.git_repo = None
+        self.source_dir = tempfile.mkdtemp(prefix=self.app_target)
+        try:
+            self.github.download_archive(
+                self.app_repository,
+                self.current_commit.sha,
+                self.app_target,
+                self.source_dir,
+            )
+        except UnresolvedLinks:
+            # A clone has the files the links point to
+            rmtree(self.source_dir, True)
+            click.echo(crayons.yellow("Links outside of the app, cloning instead."))
+            self.clone_repository(shallow=True)
+            return
+        click.echo(crayons.green("Downloaded!"))
+
+    def download_delta(self):
+        """
+        Download only the app source files that differ from the app repository.
+
+        The tree of the app source is listed once. Only files the update
+        uses are considered. A file whose blob id matches the file already
+        in the app repository is copied from there instead of downloaded.
+        Symbolic links are followed to the file they point to; the archive
+        is downloaded instead when one points to a directory, or nowhere.
+        """
+        click.echo("Fetching changed app source files...", nl=False)
+        tree = self.app_repository.get_git_tree(self.current_commit.sha, True)
+        if tree.raw_data.get("truncated"):
+            click.echo(crayons.yellow("Tree too large, downloading archive."))
+            self.download_archive()
+            return
+
+        self.git_repo = None
+        self.source_dir = tempfile.mkdtemp(prefix=self.app_target)
+        prefix = posixpath.normpath(self.app_target.strip("/"))
+        elements = {element.path: element for element in tree.tree}
+        total = downloaded = 0
+        for element in tree.tree:
+            path = element.path
+            if prefix != ".":
+                if not path.startswith(prefix + "/"):
+                    continue
+                path = path[len(prefix) + 1 :]
+            if element.type != "blob" or not (
+                path in CONFIG_FILES
+                or is_template(path)
+                or path.split("/")[0] in STATIC_FILES
+            ):
+                continue
+            if element.mode == MODE_SYMLINK:
+                link, element = element, self.resolve_link(elements, element)
+                if element is None:
+                    rmtree(self.source_dir, True)
+                    click.echo(
+                        crayons.yellow(
+                            "Cannot follow link %s, downloading archive." % link.path
+                        )
+                    )
+                    self.download_archive()
+                    return
+
+            total += 1
+            source_file = os.path.join(self.source_dir, *path.split("/"))
+            local_file = os.path.join(self.app_dir, *path.split("/"))
+            os.makedirs(os.path.dirname(source_file), exist_ok=True)
+            if self.local_entry(path) == (element.mode, element.sha):
+                copyfile(local_file, source_file)
+            else:
+                blob = self.app_repository.get_git_blob(element.sha)
+                with open(source_file, "wb") as f:
+                    f.write(base64.b64decode(blob.content))
+                downloaded += 1
+            if element.mode == MODE_EXECUTABLE:
+                os.chmod(source_file, 0o755)
+        click.echo(crayons.green("Done (%d of %d files)" % (downloaded, total)))
+
+    def resolve_link(self, elements: dict, element):
+        """
+        Return the tree element a symbolic link points to, following links.
+
+        Returns None when the link points to a directory, or to a path
+        that is not in the tree.
+        """
+        followed = set()
+        while element.mode == MODE_SYMLINK:
+            if element.path in followed:
+                return None
+            followed.add(element.path)
+            blob = self.app_repository.get_git_blob(element.sha)
+            target = base64.b64decode(blob.content).decode("utf-8", "replace")
+            element = elements.get(
+                posixpath.normpath(
+                    posixpath.join(posixpath.dirname(element.path), target)
+                )
+            )
+            if element is None or element.type != "blob":
+                return None
+        return element
+
+    def local_entry(self, path: str) -> tuple[str, str] | None:
+        """Return the mode and blob id of a file of this app in the app repository."""
+        if isinstance(self.repository, ApiPublisher):
+            target = posixpath.join(self.repository_target, path)
+            if target in self.repository.placeholders:
+                # Not downloaded, but the tree knows what it holds
+                return self.repository.entries[target]
+        local_file = os.path.join(self.app_dir, *path.split("/"))
+        if not os.path.isfile(local_file):
+            return None
+        with open(local_file, "rb") as f:
+            sha = blob_sha(f.read())
+        return MODE_EXECUTABLE if os.access(local_file, os.X_OK) else MODE_FILE, sha
+
+    def fetch_source(self):
+        """
+        Fetch the app source into a local directory.
+
+        Apps using the same source repository and commit share a single
+        checkout during a run; a full clone is even shared between apps
+        in different directories of the repository.
+        """
+        if self.source == SOURCE_DELTA:
+            # Depends on the files of this app in the app repository
+            self.download_delta()
+            return
+
+        fetched = False
+
+        def fetch():
+            nonlocal fetched
+            fetched = True
+            if self.source == SOURCE_ARCHIVE:
+                self.download_archive()
+            else:
+                self.clone_repository()
+            return self.git_repo, self.source_dir
+
+        self.git_repo, self.source_dir = self.github.checkouts.get(
+            (
+                self.app_repository.full_name,
+                self.current_commit.sha,
+                self.source,
+                None if self.source == SOURCE_CLONE else self.app_target,
+            ),
+            fetch,
+        )
+        if self.source == SOURCE_CLONE:
+            self.source_dir = os.path.join(self.git_repo.working_dir, self.app_target)
+        if not fetched:
+            click.echo(
+                "Reusing app source of %s (%s)"
+                % (
+                    crayons.yellow(self.app_repository.full_name),
+                    self.current_commit.sha[:7],
+                )
+            )
+
+    @property
+    def app_dir(self) -> str:
+        """Return the directory the app files are written to."""
+        if self.staging_dir is not None:
+            return self.staging_dir
+        return os.path.join(self.repository.working_dir, self.repository_target)
+
+    def prepare(self) -> App:
+        """
+        Prepare an update of this app in a staging directory.
+
+        The update is prepared on a copy of this app, so multiple apps can
+        be prepared concurrently, while this app and the app repository
+        stay untouched until the prepared copy is published.
+        """
+        staged = copy.copy(self)
+        staged.staging_dir = os.path.join(
+            tempfile.mkdtemp(prefix=self.repository_target), self.repository_target
+        )
+        if os.path.isdir(self.app_dir):
+            copytree(self.app_dir, staged.staging_dir, symlinks=True)
+        staged.update()
+        return staged
+
+    def publish(self, staged: App):
+        """Move the files of a prepared update into the app repository."""
+        rmtree(self.app_dir, True)
+        move(staged.staging_dir, self.app_dir)
+        rmtree(os.path.dirname(staged.staging_dir), True)
+
+        self.current_version = staged.current_version
+        self.current_release = staged.current_release
+        self.current_commit = staged.current_commit
+        self.git_repo = staged.git_repo
+        self.source_dir = staged.source_dir
+        self.written = staged.written
+
     def update(self):
         """Update this app inside the given app repository."""
         if not self.updating:
@@ -115,45 +400,29 @@ class App:
         self.current_version = self.latest_version
         self.current_release = self.latest_release
         self.current_commit = self.latest_commit
-
-        self.clone_repository()
-        self.ensure_app_dir()
-        self.generate_app_config()
-        self.update_static_files()
-        self.generate_readme()
-        self.generate_app_changelog()
-
-    def __load_current_info(self):
+        self.written = set()
+
+        for step in (
+            self.fetch_source,
+            self.ensure_app_dir,
+            self.generate_app_config,
+            self.update_static_files,
+            self.generate_readme,
+            self.generate_app_changelog,
+        ):
+            with self.github.tracer.span(step.__name__, "app"):
+                step()
+
+    def __load_current_info(self, state: dict | None = None):
         """Load current app version information and current config."""
-        config_files = ("config.json", "config.yaml", "config.yml")
-        for config_file in config_files:
-            if os.path.exists(
-                os.path.join(
-                    self.repository.working_dir, self.repository_target, config_file
-                )
-            ):
-                self.existing_config_filename = config_file
-                break
+        self.existing_config_filename, current_config = read_config(
+            os.path.join(self.repository.working_dir, self.repository_target)
+        )
 
         if self.existing_config_filename is None:
             click.echo("Current version: %s" % crayons.yellow("Not available"))
             return False
 
-        with open(
-            os.path.join(
-                self.repository.working_dir,
-                self.repository_target,
-                self.existing_config_filename,
-            ),
-            "r",
-            encoding="utf8",
-        ) as f:
-            current_config = (
-                json.load(f)
-                if self.existing_config_filename.endswith(".json")
-                else yaml.safe_load(f)
-            )
-
         self.current_version = current_config["version"]
         self.name = current_config["name"]
         self.description = current_config["description"]
@@ -162,24 +431,19 @@ class App:
         if "arch" in current_config:
             self.archs = current_config["arch"]
 
-        current_parsed_version = False
-        try:
-            current_parsed_version = semver.parse(self.current_version)
-        except ValueError:
-            pass
+        if self.__restore_state(state):
+            return True
 
-        if current_parsed_version:
-            try:
-                ref = self.app_repository.get_git_ref("tags/" + self.current_version)
-            except UnknownObjectException:
-                ref = self.app_repository.get_git_ref("tags/v" + self.current_version)
-            self.current_commit = self.app_repository.get_commit(ref.object.sha)
+        if self.resolved and self.resolved.current_commit:
+            self.current_commit = self.resolved.current_commit
         else:
-            try:
-                self.current_commit = self.app_repository.get_commit(
-                    f"v{self.current_version}"
-                )
-            except GithubException:
+            sha = self.github.index(self.app_repository).tag_commit(
+                str(self.current_version)
+            )
+            if sha is not None:
+                self.current_commit = self.github.make_commit(self.app_repository, sha)
+            else:
+                # Not a tag, e.g., the commit of an edge version
                 self.current_commit = self.app_repository.get_commit(
                     self.current_version
                 )
@@ -189,33 +453,119 @@ class App:
             % (crayons.magenta(self.current_version), self.current_commit.sha[:7])
         )
 
+    def __restore_state(self, state: dict | None) -> bool:
+        """Restore the app as resolved by a previous run, if nothing changed."""
+        if (
+            not state
+            or state["fingerprint"] != self.fingerprint
+            or state["channel"] != self.channel
+            or state["app_target"] != self.app_target
+            or state["version"] != self.current_version
+            or (self.updating and not state["latest"])
+        ):
+            return False
+
+        self.current_commit = self.github.make_commit(
+            self.app_repository, state["commit"], state["last_modified"]
+        )
+        if state["release"]:
+            self.current_release = self.github.make_release(
+                self.app_repository, **state["release"]
+            )
+
+        if self.updating:
+            latest = state["latest"]
+            self.latest_version = latest["version"]
+            self.latest_is_release = latest["is_release"]
+            self.latest_commit = self.github.make_commit(
+                self.app_repository, latest["commit"], latest["last_modified"]
+            )
+            if latest["release"]:
+                self.latest_release = self.github.make_release(
+                    self.app_repository, **latest["release"]
+                )
+            self.name = latest["name"]
+            self.description = latest["description"]
+            self.slug = latest["slug"]
+            self.url = latest["url"]
+            self.archs = latest["archs"]
+
+        self.restored = True
+        click.echo(
+            "Current version: %s (%s, unchanged since last run)"
+            % (crayons.magenta(self.current_version), self.current_commit.sha[:7])
+        )
+        return True
+
+    def get_state(self) -> dict | None:
+        """Return the resolved state of this app, to be restored next run."""
+        if self.fingerprint is None or not self.current_version:
+            return None
+
+        def release_state(release):
+            if not release:
+                return None
+            return {
+                "id": release.id,
+                "tag_name": release.tag_name,
+                "created_at": release.created_at.isoformat(),
+            }
+
+        current_release = getattr(self, "current_release", None)
+        state = {
+            "fingerprint": self.fingerprint,
+            "channel": self.channel,
+            "app_target": self.app_target,
+            "repository": {
+                "full_name": self.app_repository.full_name,
+                "html_url": self.app_repository.html_url,
+                "clone_url": self.app_repository.clone_url,
+            },
+            "version": self.current_version,
+            "commit": self.current_commit.sha,
+            "last_modified": self.current_commit.last_modified,
+            "release": release_state(current_release),
+            "latest": None,
+        }
+        if self.updating and self.latest_commit:
+            state["latest"] = {
+                "version": self.latest_version,
+                "is_release": self.latest_is_release,
+                "commit": self.latest_commit.sha,
+                "last_modified": self.latest_commit.last_modified,
+                "release": release_state(self.latest_release),
+                "name": self.name,
+                "description": self.description,
+                "slug": self.slug,
+                "url": self.url,
+                "archs": self.archs,
+            }
+        return state
+
     def __load_latest_info(self, channel: str):
         """Determine latest available app version and config."""
-        for release in self.app_repository.get_releases():
-            self.latest_version = release.tag_name.lstrip("v")
-            prerelease = (
-                release.prerelease
-                or semver.parse_version_info(self.latest_version).prerelease
-            )
-            if release.draft or (prerelease and channel != CHANNEL_BETA):
-                continue
-            self.latest_release = release
-            break
+        if self.resolved:
+            self.__load_resolved_latest_info()
+            return
+
+        index = self.github.index(self.app_repository)
+        self.latest_release = index.latest_release(channel)
 
         if self.latest_release:
-            ref = self.app_repository.get_git_ref(
-                "tags/" + self.latest_release.tag_name
+            self.latest_version = self.latest_release.tag_name.lstrip("v")
+            self.latest_commit = self.github.make_commit(
+                self.app_repository, index.release_commit(self.latest_release.tag_name)
             )
-            self.latest_commit = self.app_repository.get_commit(ref.object.sha)
 
         if channel == CHANNEL_EDGE:
-            last_commit = self.app_repository.get_commits()[0]
-            if not self.latest_commit or last_commit.sha != self.latest_commit.sha:
-                self.latest_version = last_commit.sha[:7]
-                self.latest_commit = last_commit
+            if not self.latest_commit or index.head != self.latest_commit.sha:
+                self.latest_version = index.head[:7]
+                self.latest_commit = self.github.make_commit(
+                    self.app_repository, index.head
+                )
                 self.latest_is_release = False
 
-        config_files = ["config.json", "config.yaml", "config.yml"]
+        config_files = list(CONFIG_FILES)
         # Ensure existing filename is at the start of the list
         if self.existing_config_filename is not None:
             config_files.insert(
@@ -242,10 +592,34 @@ class App:
             )
             sys.exit(1)
 
+        self.__use_latest_config(config_file, latest_config_file.decoded_content)
+
+    def __load_resolved_latest_info(self):
+        """Use the latest version and config resolved upfront."""
+        self.latest_release = self.resolved.latest_release
+        self.latest_version = self.resolved.latest_version
+        self.latest_commit = self.resolved.latest_commit
+        self.latest_is_release = self.resolved.latest_is_release
+
+        if self.resolved.config_content is None:
+            click.echo(
+                crayons.red(
+                    "An error occurred while loading the remote app "
+                    "configuration file"
+                )
+            )
+            sys.exit(1)
+
+        self.__use_latest_config(
+            self.resolved.config_file, self.resolved.config_content
+        )
+
+    def __use_latest_config(self, config_file: str, content):
+        """Load app information from the latest remote configuration."""
         latest_config = (
-            json.loads(latest_config_file.decoded_content)
+            json.loads(content)
             if config_file.endswith(".json")
-            else yaml.safe_load(latest_config_file.decoded_content)
+            else yaml.safe_load(content)
         )
 
         self.name = latest_config["name"]
@@ -270,7 +644,7 @@ class App:
 
     def ensure_app_dir(self):
         """Ensure the app target directory exists."""
-        app_path = os.path.join(self.repository.working_dir, self.repository_target)
+        app_path = self.app_dir
         app_translations_path = os.path.join(app_path, "translations")
 
         if not os.path.exists(app_path):
@@ -283,12 +657,9 @@ class App:
         """Generate app configuration file."""
         click.echo("Generating app configuration...", nl=False)
 
-        config_files = ("config.json", "config.yaml", "config.yml")
         config_file = None
-        for config_file in config_files:
-            if os.path.exists(
-                os.path.join(self.git_repo.working_dir, self.app_target, config_file)
-            ):
+        for config_file in CONFIG_FILES:
+            if os.path.exists(os.path.join(self.source_dir, config_file)):
                 break
             config_file = None
 
@@ -297,7 +668,7 @@ class App:
             sys.exit(1)
 
         with open(
-            os.path.join(self.git_repo.working_dir, self.app_target, config_file),
+            os.path.join(self.source_dir, config_file),
             encoding="utf8",
         ) as f:
             config = (
@@ -307,22 +678,15 @@ class App:
         config["version"] = self.current_version
         config["image"] = self.image
 
-        for old_config_file in config_files:
+        for old_config_file in CONFIG_FILES:
             try:
-                os.unlink(
-                    os.path.join(
-                        self.repository.working_dir,
-                        self.repository_target,
-                        old_config_file,
-                    )
-                )
+                os.unlink(os.path.join(self.app_dir, old_config_file))
+                self.written.add(old_config_file)
             except:
                 pass
 
         with open(
-            os.path.join(
-                self.repository.working_dir, self.repository_target, config_file
-            ),
+            os.path.join(self.app_dir, config_file),
             "w",
             encoding="utf8",
         ) as outfile:
@@ -336,6 +700,7 @@ class App:
                 )
             else:
                 yaml.dump(config, outfile, default_flow_style=False, sort_keys=False)
+        self.written.add(config_file)
 
         click.echo(crayons.green("Done"))
 
@@ -346,55 +711,92 @@ class App:
         if self.latest_is_release:
             changelog = self.current_release.body
         elif self.latest_release:
-            compare = self.app_repository.compare(
-                self.current_release.tag_name, self.current_commit.sha
+            changelog = "".join(
+                [
+                    "# Changelog since %s\n" % self.current_release.tag_name,
+                    *("- %s \n" % message for message in self.changelog_messages()),
+                ]
             )
-            changelog = "# Changelog since %s\n" % self.current_release.tag_name
-            for commit in reversed(compare.commits):
-                changelog += "- %s \n" % (commit.commit.message)
         else:
             changelog += "- %s\n" % (self.current_commit.commit.message)
 
         changelog = emoji.emojize(changelog, language="alias")
 
         with open(
-            os.path.join(
-                self.repository.working_dir, self.repository_target, "CHANGELOG.md"
-            ),
+            os.path.join(self.app_dir, "CHANGELOG.md"),
             "w",
             encoding="utf8",
         ) as outfile:
             outfile.write(changelog)
+        self.written.add("CHANGELOG.md")
 
         click.echo(crayons.green("Done"))
 
+    def changelog_messages(self):
+        """
+        Yield the commit messages since the current release, newest first.
+
+        With a full clone of the app source, they are streamed from its
+        history, limited to commits touching the app. Otherwise, they are
+        taken from a comparison by the GitHub API.
+        """
+        tag = self.current_release.tag_name
+        if self.git_repo is not None and self.source == SOURCE_CLONE:
+            args = [
+                "-z",
+                "--format=%B",
+                f"--max-count={self.changelog_limit}",
+                f"{tag}..{self.current_commit.sha}",
+            ]
+            if posixpath.normpath(self.app_target.strip("/")) != ".":
+                args += ["--", self.app_target.strip("/")]
+            process = self.git_repo.git.log(*args, as_process=True)
+            yielded = False
+            try:
+                pending = b""
+                for chunk in iter(lambda: process.stdout.read(LOG_CHUNK_SIZE), b""):
+                    *messages, pending = (pending + chunk).split(b"\0")
+                    for message in messages:
+                        yielded = True
+                        yield message.decode("utf8", "replace").rstrip("\n")
+                process.wait()
+                if pending:
+                    yield pending.decode("utf8", "replace").rstrip("\n")
+                return
+            except GitCommandError:
+                if yielded:
+                    raise
+
+        compare = self.app_repository.compare(tag, self.current_commit.sha)
+        for commit in islice(reversed(compare.commits), self.changelog_limit):
+            yield commit.commit.message
+
     def update_static_files(self):
         """Update the static app files within the repository."""
-        self.update_static("logo.png")
-        self.update_static("icon.png")
-        self.update_static("README.md")
-        self.update_static("DOCS.md")
-        self.update_static("apparmor.txt")
-        self.update_static("translations")
+        for file in STATIC_FILES:
+            self.update_static(file)
 
     def update_static(self, file):
-        """Download latest static file/directory from app repository."""
+        """Sync latest static file/directory from app repository."""
         click.echo(f"Syncing app static {file}...", nl=False)
-        local_file = os.path.join(
-            self.repository.working_dir, self.repository_target, file
-        )
-        remote_file = os.path.join(self.git_repo.working_dir, self.app_target, file)
+        remote_file = os.path.join(self.source_dir, file)
+        existed = os.path.lexists(os.path.join(self.app_dir, file))
+        if not os.path.lexists(remote_file) and os.path.isdir(
+            os.path.join(self.app_dir, file)
+        ):
+            # Directories are only replaced, never removed
+            click.echo(crayons.blue("Skipping"))
+            return
 
-        if os.path.exists(remote_file) and os.path.isfile(remote_file):
-            copyfile(remote_file, local_file)
-            click.echo(crayons.green("Done"))
-        elif os.path.exists(remote_file) and os.path.isdir(remote_file):
-            rmtree(local_file)
-            copytree(remote_file, local_file)
-            click.echo(crayons.green("Done"))
-        elif os.path.isfile(local_file):
-            os.remove(local_file)
+        changes = sync(self.source_dir, self.app_dir, file)
+        self.written.update(changes)
+
+        if changes and not os.path.exists(remote_file):
             click.echo(crayons.yellow("Removed"))
+        elif changes:
+            click.echo(crayons.green("Done"))
+        elif existed:
+            click.echo(crayons.blue("Unchanged"))
         else:
             click.echo(crayons.blue("Skipping"))
 
@@ -402,31 +804,26 @@ class App:
         """Re-generate the app readme based on a template."""
         click.echo("Re-generating app README.md file...", nl=False)
 
-        app_file = os.path.join(
-            self.git_repo.working_dir, self.app_target, ".README.j2"
-        )
+        app_file = os.path.join(self.source_dir, ".README.j2")
         if not os.path.exists(app_file):
             click.echo(crayons.blue("Skipping"))
             return
 
-        local_file = os.path.join(
-            self.repository.working_dir, self.repository_target, "README.md"
-        )
-
-        data = self.get_template_data()
+        local_file = os.path.join(self.app_dir, "README.md")
 
-        jinja = Environment(
-            loader=BaseLoader(),
-            trim_blocks=True,
-            extensions=["jinja2.ext.loopcontrols"],
-        )
+        with open(app_file, encoding="utf8") as f:
+            template = f.read()
 
-        with open(local_file, "w", encoding="utf8") as outfile:
-            outfile.write(
-                jinja.from_string(open(app_file, encoding="utf8").read()).render(
-                    **data
-                )
-            )
+        if not self.github.templates.render_file(
+            posixpath.join(self.repository_target, "README.md"),
+            template,
+            self.get_template_data(),
+            local_file,
+            self.source_dir,
+        ):
+            click.echo(crayons.blue("Unchanged"))
+            return
+        self.written.add("README.md")
 
         click.echo(crayons.green("Done"))
 
@@ -461,6 +858,80 @@ class App:
         try:
             data["date"] = self.current_release.created_at
         except AttributeError:
-            data["date"] = self.current_commit.last_modified
+            # Commits taken from the index only fetch their details when needed
+            data["date"] = (
+                self.current_commit.last_modified
+                or self.current_commit.complete().last_modified
+            )
 
         return data
+
+
+class LazyApp(App):
+    """
+    App that is not updated this run, loaded from local information only.
+
+    Its details come from its configuration in the app repository and
+    from the state of a previous run. The commit and its date are not
+    known without that state, so the app is then loaded using the GitHub
+    API after all, when the README is rendered.
+    """
+
+    state: RunState | None
+    loaded: bool
+
+    def load(self, state: RunState | None = None):
+        """Load the app information available locally."""
+        self.state = state
+        self.loaded = False
+        self.current_commit = None
+        self.current_release = None
+        self.existing_config_filename, config = read_config(self.app_dir)
+        if config is None:
+            return
+
+        self.current_version = config["version"]
+        self.name = config["name"]
+        self.description = config["description"]
+        self.slug = config["slug"]
+        self.url = config["url"]
+        if "arch" in config:
+            self.archs = config["arch"]
+
+        previous = state.get(self.repository_target) if state else None
+        if previous and previous["version"] == self.current_version:
+            self.current_commit = self.github.make_commit(
+                self.app_repository, previous["commit"], previous["last_modified"]
+            )
+            if previous["release"]:
+                self.current_release = self.github.make_release(
+                    self.app_repository, **previous["release"]
+                )
+
+    def ensure_loaded(self):
+        """Fully load the app, using the GitHub API."""
+        if not self.loaded:
+            click.echo(
+                crayons.yellow(
+                    "No state of %s from a previous run, loading it using the "
+                    "GitHub API (use --state-file to skip this)"
+                    % self.repository_target
+                )
+            )
+            App.load(self, self.state)
+            self.loaded = True
+
+    def get_template_data(self):
+        """Return a dictionary with app information, loading it when missing."""
+        if self.current_version and self.current_commit is None:
+            self.ensure_loaded()
+        return super().get_template_data()
+
+    def get_state(self) -> dict | None:
+        """Return the state of this app, as known by the previous run."""
+        if self.loaded:
+            return super().get_state()
+        previous = self.state.get(self.repository_target) if self.state else None
+        if previous and previous["version"] != self.current_version:
+            return None
+        return previous
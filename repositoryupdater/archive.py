@@ -0,0 +1,105 @@
+"""
+Archive module.
+
+Extracts a single directory from a (streamed) repository tarball,
+as served by GitHub, without writing anything else to disk.
+"""
+
+import os
+import posixpath
+import shutil
+import tarfile
+
+
+class UnresolvedLinks(Exception):
+    """Raised when symbolic links point outside the extracted directory."""
+
+
+def resolve_links(links: dict, destination: str) -> int:
+    """
+    Replace symbolic links by copies of what they point to.
+
+    Links are given by their path and their target, both relative to
+    the destination, and may point to other links. Raises
+    `UnresolvedLinks` for links pointing outside of the destination,
+    or to nothing. Returns the number of files copied.
+    """
+    copied = 0
+    pending = dict(links)
+    while pending:
+        progress = False
+        for name, target in list(pending.items()):
+            if (
+                target in ("..", ".")
+                or target.startswith("../")
+                or name.startswith(target + "/")
+                or target in pending
+            ):
+                continue
+            source = os.path.join(destination, *target.split("/"))
+            path = os.path.join(destination, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.isdir(source):
+                shutil.copytree(source, path, dirs_exist_ok=True)
+            elif os.path.isfile(source):
+                shutil.copyfile(source, path)
+                shutil.copymode(source, path)
+            else:
+                continue
+            copied += 1
+            del pending[name]
+            progress = True
+        if not progress:
+            raise UnresolvedLinks(
+                "Links outside of the directory: %s" % ", ".join(sorted(pending))
+            )
+    return copied
+
+
+def extract_subtree(fileobj, path: str, destination: str) -> int:
+    """
+    Extract the given path of a GitHub repository tarball.
+
+    The tarball is read as a stream, so it does not have to be seekable.
+    GitHub wraps all files in a single top level directory, which is
+    ignored. Regular files and directories below the path are extracted
+    into the destination, and symbolic links are replaced by copies of
+    their targets, like a checkout would follow them. The number of files
+    is returned. Raises `UnresolvedLinks` when a link points outside of
+    the path, as its target was not kept.
+    """
+    prefix = posixpath.normpath(path.strip("/")) if path else "."
+    extracted = 0
+    links = {}
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+        for member in tar:
+            parts = member.name.split("/", 1)
+            if len(parts) < 2:
+                continue
+            name = posixpath.normpath(parts[1])
+            if prefix != ".":
+                if name != prefix and not name.startswith(prefix + "/"):
+                    continue
+                name = posixpath.relpath(name, prefix)
+            if name.startswith("../") or name == ".." or posixpath.isabs(name):
+                continue
+
+            target = os.path.join(destination, *name.split("/"))
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+            elif member.isfile():
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with tar.extractfile(member) as source, open(target, "wb") as f:
+                    shutil.copyfileobj(source, f)
+                if member.mode & 0o111:
+                    os.chmod(target, 0o755)
+                extracted += 1
+            elif member.issym():
+                links[name] = (
+                    ".."
+                    if posixpath.isabs(member.linkname)
+                    else posixpath.normpath(
+                        posixpath.join(posixpath.dirname(name), member.linkname)
+                    )
+                )
+    return extracted + resolve_links(links, destination)
@@ -0,0 +1,30 @@
+"""
+Askpass module.
+
+Git credentials helper, started by git for every clone, fetch and push.
+It must start fast, so it only depends on the standard library; do not
+import any other module of this package here.
+"""
+
+import sys
+from os import environ
+from sys import argv
+
+
+def git_askpass():
+    """
+    Git credentials helper.
+
+    Short & sweet script for use with git clone and fetch credentials.
+    Requires GIT_USERNAME and GIT_PASSWORD environment variables,
+    intended to be called by Git via GIT_ASKPASS.
+    """
+    if argv[1] == "Username for 'https://github.com': ":
+        print(environ["GIT_USERNAME"])
+        sys.exit()
+
+    if argv[1] == "Password for 'https://" "%(GIT_USERNAME)s@github.com': " % environ:
+        print(environ["GIT_PASSWORD"])
+        sys.exit()
+
+    sys.exit(1)
@@ -0,0 +1,143 @@
+"""
+Cache module.
+
+Persistent on-disk cache of GitHub API responses, used to turn repeated
+requests into conditional requests (ETag / Last-Modified). Responses
+that did not change (304) are served from disk and do not count
+against the primary rate limit of GitHub.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .const import DEFAULT_CACHE_SIZE
+
+
+class ResponseCache:
+    """Size-bounded, least recently used, on-disk HTTP response cache."""
+
+    directory: str
+    max_size: int
+    size: int
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE):
+        """Initialize a new response cache in the given directory."""
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.size = sum(size for _, size, _ in self.entries())
+
+    @staticmethod
+    def key(url: str, headers: dict) -> str:
+        """Return the cache key for a request, scoped to its credentials."""
+        scope = "\n".join(
+            (
+                headers.get("Authorization", ""),
+                headers.get("Accept", ""),
+                url,
+            )
+        )
+        return hashlib.sha256(scope.encode("utf8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        """Return the path of the cache file for a key."""
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def entries(self):
+        """Yield path, size and last use time of all cache files."""
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key: str) -> dict | None:
+        """Return a cached response and mark it as recently used."""
+        path = self.path(key)
+        try:
+            with open(path, encoding="utf8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def store(self, key: str, response: requests.Response):
+        """Store a response, if the server supports revalidating it."""
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() in ("etag", "last-modified", "content-type", "link")
+        }
+        if "etag" not in response.headers and "last-modified" not in response.headers:
+            return
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf8", dir=os.path.dirname(path), delete=False
+        ) as f:
+            json.dump({"headers": headers, "body": response.text}, f)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        os.replace(f.name, path)
+
+        with self.lock:
+            self.size += os.path.getsize(path) - previous
+            if self.size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """Remove least recently used responses until the cache fits."""
+        for path, size, _ in sorted(self.entries(), key=lambda entry: entry[2]):
+            if self.size <= self.max_size * 0.9:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            self.size -= size
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        """Return the headers that revalidate a cached response."""
+        headers = CaseInsensitiveDict(entry["headers"])
+        conditional = {}
+        if "etag" in headers:
+            conditional["If-None-Match"] = headers["etag"]
+        if "last-modified" in headers:
+            conditional["If-Modified-Since"] = headers["last-modified"]
+        return conditional
+
+    @staticmethod
+    def response(entry: dict, revalidation: requests.Response) -> requests.Response:
+        """Build a full response from a cached entry and a 304 revalidation."""
+        response = requests.Response()
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        # Rate limit information and the like come from the fresh response
+        response.headers.update(
+            (name, value)
+            for name, value in revalidation.headers.items()
+            if not name.lower().startswith(("content-", "transfer-"))
+        )
+        response.encoding = "utf-8"
+        response.url = revalidation.url
+        response.request = revalidation.request
+        # pylint: disable=protected-access
+        response._content = entry["body"].encode("utf-8")
+        return response
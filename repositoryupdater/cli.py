@@ -3,19 +3,31 @@ CLI Module.
 
 Handles CLI for the Repository Updater
 """
-import sys
-from os import environ
-from sys import argv
 
 import click
 import crayons
 
 from . import APP_FULL_NAME, APP_VERSION
-from .github import GitHub
-from .repository import Repository
+from .askpass import git_askpass  # noqa: F401 pylint: disable=unused-import
+from .const import (
+    BATCH_MODES,
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_CHANGELOG_LIMIT,
+    DEFAULT_MAX_CHANGES,
+    DEFAULT_PUSH_ATTEMPTS,
+    DEFAULT_REQUEST_TIMEOUT,
+    EXIT_DEFERRED,
+    PUBLISH_GIT,
+    PUBLISHERS,
+    SOURCE_CLONE,
+    SOURCES,
+)
+
+# Everything else is imported when used, so `--version`, `--help` and
+# shell completion do not pay for loading PyGithub, GitPython and Jinja.
 
 
-@click.command()
+@click.group(invoke_without_command=True)
 @click.option(
     "--token",
     hide_input=True,
@@ -37,35 +49,328 @@ from .repository import Repository
     metavar="<TARGET>",
 )
 @click.option("--force", is_flag=True, help="Force an update of the app repository")
+@click.option(
+    "--concurrency",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of apps to load and update concurrently",
+    metavar="<N>",
+)
+@click.option(
+    "--graphql",
+    is_flag=True,
+    help="Resolve app versions using batched GraphQL queries",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    envvar="REPOSITORY_UPDATER_CACHE_DIR",
+    help="Directory to cache GitHub API responses in between runs",
+    metavar="<DIRECTORY>",
+)
+@click.option(
+    "--cache-size",
+    default=DEFAULT_CACHE_SIZE // 1024 // 1024,
+    type=click.IntRange(min=1),
+    help="Maximum size of the GitHub API response cache in MB",
+    metavar="<MB>",
+)
+@click.option(
+    "--template-cache-dir",
+    type=click.Path(file_okay=False),
+    envvar="REPOSITORY_UPDATER_TEMPLATE_CACHE_DIR",
+    help="Directory to keep compiled templates and README renders in between runs",
+    metavar="<DIRECTORY>",
+)
+@click.option(
+    "--request-timeout",
+    default=DEFAULT_REQUEST_TIMEOUT,
+    type=click.IntRange(min=1),
+    envvar="REPOSITORY_UPDATER_REQUEST_TIMEOUT",
+    help="Number of seconds to wait for a GitHub API response, before retrying",
+    metavar="<SECONDS>",
+)
+@click.option(
+    "--app-source",
+    default=SOURCE_CLONE,
+    type=click.Choice(SOURCES),
+    help="How to fetch the source of apps that are updated",
+)
+@click.option(
+    "--changelog-limit",
+    default=DEFAULT_CHANGELOG_LIMIT,
+    type=click.IntRange(min=1),
+    help="Maximum number of commits listed in the changelog of edge apps",
+    metavar="<N>",
+)
+@click.option(
+    "--mirror-dir",
+    type=click.Path(file_okay=False),
+    envvar="REPOSITORY_UPDATER_MIRROR_DIR",
+    help="Directory to keep git mirrors of cloned repositories in between runs",
+    metavar="<DIRECTORY>",
+)
+@click.option(
+    "--state-file",
+    type=click.Path(dir_okay=False),
+    envvar="REPOSITORY_UPDATER_STATE_FILE",
+    help="File to keep app state in, to skip unchanged apps in the next run",
+    metavar="<FILE>",
+)
+@click.option(
+    "--batch",
+    type=click.Choice(BATCH_MODES),
+    envvar="REPOSITORY_UPDATER_BATCH",
+    help="Commit only the files apps wrote, and render the README once, "
+    "in one combined commit or in one commit per app",
+)
+@click.option(
+    "--publish",
+    default=PUBLISH_GIT,
+    type=click.Choice(PUBLISHERS),
+    envvar="REPOSITORY_UPDATER_PUBLISH",
+    help="Publish using a git clone, or through the API without cloning",
+)
+@click.option(
+    "--publish-max-changes",
+    default=DEFAULT_MAX_CHANGES,
+    type=click.IntRange(min=1),
+    help="Maximum number of changed files to publish through the API",
+    metavar="<N>",
+)
+@click.option(
+    "--push-attempts",
+    default=DEFAULT_PUSH_ATTEMPTS,
+    type=click.IntRange(min=1),
+    envvar="REPOSITORY_UPDATER_PUSH_ATTEMPTS",
+    help="Number of times to try pushing, rebasing when someone else pushed",
+    metavar="<N>",
+)
+@click.option(
+    "--deadline",
+    type=click.IntRange(min=1),
+    envvar="REPOSITORY_UPDATER_DEADLINE",
+    help="Number of seconds the run may take, apps with releases waiting "
+    "the longest are updated first, the rest is deferred to the next run",
+    metavar="<SECONDS>",
+)
+@click.option(
+    "--report",
+    type=click.Path(dir_okay=False),
+    envvar="REPOSITORY_UPDATER_REPORT",
+    help="File to write a JSON report of the GitHub API usage to",
+    metavar="<FILE>",
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False),
+    envvar="REPOSITORY_UPDATER_TRACE",
+    help="File to write a timeline of the run to, in Chrome trace format",
+    metavar="<FILE>",
+)
 @click.version_option(APP_VERSION, prog_name=APP_FULL_NAME)
-def repository_updater(token, repository, app, force):
+@click.pass_context
+def repository_updater(
+    ctx,
+    token,
+    repository,
+    app,
+    force,
+    concurrency,
+    graphql,
+    cache_dir,
+    cache_size,
+    template_cache_dir,
+    request_timeout,
+    app_source,
+    changelog_limit,
+    mirror_dir,
+    state_file,
+    batch,
+    publish,
+    publish_max_changes,
+    push_attempts,
+    deadline,
+    report,
+    trace,
+):
     """Home Assistant Community Apps Repository Updater."""
+    # pylint: disable=import-outside-toplevel
+    from .cache import ResponseCache
+    from .deadline import Deadline
+    from .github import GitHub
+    from .repository import Repository
+    from .state import RunState
+
+    run_deadline = Deadline(deadline) if deadline else None
     click.echo(crayons.blue(APP_FULL_NAME, bold=True))
     click.echo(crayons.blue("-" * 51, bold=True))
-    github = GitHub(token)
-    click.echo(
-        "Authenticated with GitHub as %s"
-        % crayons.yellow(github.get_user().name, bold=True)
+
+    cache = None
+    if cache_dir:
+        cache = ResponseCache(cache_dir, cache_size * 1024 * 1024)
+    github = GitHub(
+        token,
+        pool_size=concurrency,
+        cache=cache,
+        template_dir=template_cache_dir,
+        mirror_dir=mirror_dir,
+        timeout=request_timeout,
     )
-    repository = Repository(github, repository, app, force)
-    repository.update()
-    repository.cleanup()
+    if report:
+        github.record_rate_limits("before")
+
+        def save_report():
+            github.record_rate_limits("after")
+            github.report.save(report)
 
+        ctx.call_on_close(save_report)
+    if trace:
+        github.tracer.start()
+        ctx.call_on_close(lambda: github.tracer.save(trace))
 
-def git_askpass():
-    """
-    Git credentials helper.
+    def create_repository(app, shard=None, lazy=False, deadline=None):
+        click.echo(
+            "Authenticated with GitHub as %s"
+            % crayons.yellow(github.user.name, bold=True)
+        )
+        return Repository(
+            github,
+            repository,
+            app,
+            force,
+            concurrency,
+            graphql,
+            app_source,
+            RunState(state_file) if state_file else None,
+            batch,
+            publish,
+            publish_max_changes,
+            changelog_limit,
+            shard,
+            lazy,
+            push_attempts,
+            deadline,
+        )
 
-    Short & sweet script for use with git clone and fetch credentials.
-    Requires GIT_USERNAME and GIT_PASSWORD environment variables,
-    intended to be called by Git via GIT_ASKPASS.
-    """
-    if argv[1] == "Username for 'https://github.com': ":
-        print(environ["GIT_USERNAME"])
-        sys.exit()
+    ctx.obj = create_repository
+    if ctx.invoked_subcommand is None:
+        repository = create_repository(app, deadline=run_deadline)
+        repository.update()
+        repository.cleanup()
+        if repository.deferred:
+            ctx.exit(EXIT_DEFERRED)
+
+
+@repository_updater.command()
+@click.option(
+    "--listen",
+    help="Address to accept events on over HTTP",
+    metavar="<HOST:PORT>",
+)
+@click.option(
+    "--spool-dir",
+    type=click.Path(file_okay=False),
+    help="Directory to pick up events from, one JSON file per event",
+    metavar="<DIRECTORY>",
+)
+@click.option(
+    "--secret",
+    envvar="REPOSITORY_UPDATER_WEBHOOK_SECRET",
+    help="Secret to verify the signature of events received over HTTP",
+    metavar="<SECRET>",
+)
+@click.pass_obj
+def serve(create_repository, listen, spool_dir, secret):
+    """Keep running and update apps when release or push events arrive."""
+    from .daemon import Daemon  # pylint: disable=import-outside-toplevel
+
+    if not listen and not spool_dir:
+        raise click.UsageError("Either --listen or --spool-dir is required")
+
+    daemon = Daemon(create_repository(None), secret)
+    try:
+        daemon.serve_forever(listen, spool_dir)
+    finally:
+        daemon.repository.cleanup()
+
+
+def validate_shard(ctx, param, value):  # pylint: disable=unused-argument
+    """Parse the shard option."""
+    from .plan import parse_shard  # pylint: disable=import-outside-toplevel
+
+    try:
+        return parse_shard(value)
+    except ValueError as err:
+        raise click.BadParameter(str(err)) from err
+
+
+@repository_updater.command()
+@click.option(
+    "--shard",
+    default="1/1",
+    callback=validate_shard,
+    help="Part of the apps to plan, e.g., 2/4 for the second of four parts",
+    metavar="<I/N>",
+)
+@click.option(
+    "--output",
+    required=True,
+    type=click.Path(dir_okay=False),
+    help="File to write the plan to",
+    metavar="<FILE>",
+)
+@click.pass_obj
+def plan(create_repository, shard, output):
+    """Prepare updates of a part of the apps and write them to a plan."""
+    # pylint: disable=import-outside-toplevel
+    from .plan import create_plan, save_plan
+
+    repository = create_repository(None, shard=shard)
+    try:
+        click.echo(crayons.green("-" * 50, bold=True))
+        planned = create_plan(repository)
+        save_plan(planned, output)
+        click.echo(
+            "Planned %s app updates into %s"
+            % (crayons.yellow(len(planned["apps"])), crayons.yellow(output))
+        )
+    finally:
+        repository.github.release_checkouts()
+        repository.cleanup()
+
+
+@repository_updater.command()
+@click.argument(
+    "plans",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.pass_obj
+def apply(create_repository, plans):
+    """Apply the plans of all parts, render the README once and push."""
+    # pylint: disable=import-outside-toplevel
+    from .plan import apply_plans, check_shards, load_plan
+    from .state import RunState
 
-    if argv[1] == "Password for 'https://" "%(GIT_USERNAME)s@github.com': " % environ:
-        print(environ["GIT_PASSWORD"])
-        sys.exit()
+    try:
+        loaded = [load_plan(path) for path in plans]
+        check_shards(loaded)
+    except ValueError as err:
+        raise click.ClickException(str(err)) from err
 
-    sys.exit(1)
+    repository = create_repository(None, lazy=True)
+    if repository.state is None:
+        repository.state = RunState()
+    try:
+        try:
+            needs_push = apply_plans(repository, loaded)
+        except ValueError as err:
+            raise click.ClickException(str(err)) from err
+        if needs_push:
+            repository.push()
+        if repository.state.path is not None:
+            repository.save_state()
+    finally:
+        repository.cleanup()
@@ -4,3 +4,32 @@ CHANNEL_STABLE = "stable"
 CHANNEL_BETA = "beta"
 CHANNEL_EDGE = "edge"
 CHANNELS = [CHANNEL_STABLE, CHANNEL_BETA, CHANNEL_EDGE]
+
+SOURCE_CLONE = "clone"
+SOURCE_SHALLOW = "shallow"
+SOURCE_ARCHIVE = "archive"
+SOURCE_DELTA = "delta"
+SOURCES = [SOURCE_CLONE, SOURCE_SHALLOW, SOURCE_ARCHIVE, SOURCE_DELTA]
+
+CONFIG_FILES = ("config.json", "config.yaml", "config.yml")
+REPOSITORY_CONFIG_FILES = (".apps.yml", ".addons.yml", ".hassio-addons.yml")
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+DEFAULT_MAX_CHANGES = 100
+DEFAULT_CHANGELOG_LIMIT = 250
+DEFAULT_PUSH_ATTEMPTS = 5
+DEFAULT_REQUEST_TIMEOUT = 15
+
+PUSH_BACKOFF_BASE = 1.0
+PUSH_BACKOFF_MAX = 30.0
+
+DEADLINE_RESERVE = 60.0
+EXIT_DEFERRED = 3
+
+BATCH_COMBINED = "combined"
+BATCH_APPS = "apps"
+BATCH_MODES = [BATCH_COMBINED, BATCH_APPS]
+
+PUBLISH_GIT = "git"
+PUBLISH_API = "api"
+PUBLISHERS = [PUBLISH_GIT, PUBLISH_API]
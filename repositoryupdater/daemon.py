@@ -0,0 +1,209 @@
+"""
+Daemon module.
+
+Keeps the apps repository, the GitHub client and all loaded apps warm
+in a long-running process, and applies release / push events as they
+arrive over HTTP or through a spool directory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+import crayons
+
+from .repository import Repository
+
+SPOOL_INTERVAL = 1.0
+RELEASE_ACTIONS = ("published", "released", "prereleased")
+
+
+def is_relevant(event: dict, kind: str | None = None) -> bool:
+    """
+    Determine whether an event may change an app.
+
+    Only releases being published and pushes to the default branch are,
+    besides simple `{"app": ...}` events. Without the kind of webhook
+    event, e.g. for spooled events, it is derived from the payload.
+    """
+    if "app" in event:
+        return True
+    if kind is None:
+        kind = "release" if "release" in event else "push" if "ref" in event else None
+    repository = event.get("repository")
+    if not isinstance(repository, dict):
+        return False
+    if kind == "release":
+        return event.get("action") in RELEASE_ACTIONS
+    if kind == "push":
+        return event.get("ref") == "refs/heads/%s" % repository.get("default_branch")
+    return False
+
+
+class Daemon:
+    """Long-running updater that applies incoming events one at a time."""
+
+    repository: Repository
+    secret: str | None
+    events: queue.Queue
+    stale: bool
+
+    def __init__(self, repository: Repository, secret: str | None = None):
+        """Initialize a new daemon for an already loaded repository."""
+        self.repository = repository
+        self.secret = secret
+        self.events = queue.Queue()
+        self.stopped = threading.Event()
+        self.stale = False
+
+    def serve_forever(self, listen: str | None = None, spool_dir: str | None = None):
+        """Accept events and apply them, until interrupted."""
+        server = None
+        if listen:
+            host, _, port = listen.rpartition(":")
+            server = ThreadingHTTPServer((host, int(port)), self.handler())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            click.echo("Listening for events on %s" % crayons.yellow(listen))
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            threading.Thread(target=self.watch, args=(spool_dir,), daemon=True).start()
+            click.echo("Watching for events in %s" % crayons.yellow(spool_dir))
+
+        # Bring everything up to date once, forced updates only apply to that
+        self.apply(None)
+        self.repository.force = False
+
+        try:
+            while True:
+                self.apply(self.next_app())
+        except KeyboardInterrupt:
+            click.echo(crayons.yellow("Stopping..."))
+        finally:
+            self.stopped.set()
+            if server is not None:
+                server.shutdown()
+
+    def next_app(self) -> str:
+        """Wait for the next event and return the app it is about."""
+        while True:
+            app = self.app_for(self.events.get())
+            if app is not None:
+                return app
+
+    def app_for(self, event: dict) -> str | None:
+        """
+        Return the app target or source repository an event is about.
+
+        Events are either GitHub webhook payloads of the source repository
+        of an app, or simple `{"app": "<target or repository>"}` objects.
+        """
+        app = event.get("app")
+        if app is None and isinstance(event.get("repository"), dict):
+            app = event["repository"].get("full_name")
+        if app is None:
+            click.echo(crayons.yellow("Ignoring event without app or repository"))
+            return None
+        if not self.repository.has_app(app):
+            click.echo(crayons.yellow('Ignoring event for unknown app "%s"' % app))
+            return None
+        return app
+
+    def apply(self, app: str | None):
+        """
+        Refresh the repository and update the app (or all apps).
+
+        When applying an event failed, the local changes are discarded,
+        while the loaded apps still hold the versions they were updated
+        to. All apps are then loaded again from the repository with the
+        next event, so the update is not lost.
+        """
+        click.echo(crayons.green("=" * 50, bold=True))
+        if app is not None:
+            click.echo(crayons.green('Handling event for app "%s"' % app))
+        try:
+            if app is not None:
+                changed = self.repository.refresh()
+                self.repository.reload_apps(app, reload_config=changed or self.stale)
+                self.stale = False
+            self.repository.update()
+        except (Exception, SystemExit) as err:  # pylint: disable=broad-except
+            click.echo(crayons.red("Failed: %s" % err))
+            self.stale = True
+            try:
+                self.repository.refresh()
+            except Exception as refresh_err:  # pylint: disable=broad-except
+                click.echo(crayons.red("Failed: %s" % refresh_err))
+
+    def verify(self, body: bytes, signature: str | None) -> bool:
+        """Verify the webhook signature of a request body, if a secret is set."""
+        if not self.secret:
+            return True
+        if not signature:
+            return False
+        expected = hmac.new(self.secret.encode("utf8"), body, hashlib.sha256)
+        return hmac.compare_digest("sha256=" + expected.hexdigest(), signature)
+
+    def watch(self, spool_dir: str):
+        """Queue the events dropped into the spool directory, oldest first."""
+        while not self.stopped.is_set():
+            entries = sorted(
+                (
+                    entry
+                    for entry in os.scandir(spool_dir)
+                    if entry.name.endswith(".json")
+                ),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            for entry in entries:
+                try:
+                    with open(entry.path, encoding="utf8") as f:
+                        event = json.load(f)
+                except ValueError:
+                    click.echo(crayons.red("Ignoring invalid event %s" % entry.name))
+                    event = None
+                except OSError:
+                    continue
+                os.unlink(entry.path)
+                if isinstance(event, dict) and is_relevant(event):
+                    self.events.put(event)
+            time.sleep(SPOOL_INTERVAL)
+
+    def handler(self):
+        """Return an HTTP request handler class that queues events."""
+        daemon = self
+
+        class EventHandler(BaseHTTPRequestHandler):
+            """Accepts events as JSON, posted to any path."""
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """Verify and queue a single event."""
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not daemon.verify(body, self.headers.get("X-Hub-Signature-256")):
+                    self.send_error(401, "Invalid signature")
+                    return
+                try:
+                    event = json.loads(body)
+                except ValueError:
+                    self.send_error(400, "Invalid JSON")
+                    return
+                if not isinstance(event, dict):
+                    self.send_error(400, "Expected a JSON object")
+                    return
+                if not is_relevant(event, self.headers.get("X-GitHub-Event")):
+                    # E.g. pings, issues, stars or pushes to other branches
+                    self.send_response(204)
+                    self.end_headers()
+                    return
+                daemon.events.put(event)
+                self.send_response(202)
+                self.end_headers()
+
+        return EventHandler
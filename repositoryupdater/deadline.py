@@ -0,0 +1,66 @@
+"""
+Deadline module.
+
+Keeps track of the time budget of a run, so a run that is about to be
+killed by a hard timeout stops updating apps in time to still commit
+and push what it did, and orders the updates so the apps with releases
+waiting the longest go first.
+"""
+
+from __future__ import annotations
+
+import time
+from email.utils import parsedate_to_datetime
+
+from .const import DEADLINE_RESERVE
+
+
+def priority(app) -> tuple:
+    """
+    Return the sort key of a pending app update: oldest releases first.
+
+    Edge updates go after releases, by commit date when it is known
+    already, e.g. resolved using GraphQL. Looking up the tag and head
+    index does not give dates, so those keep their configuration order.
+    """
+    published = None
+    if app.latest_is_release and app.latest_release is not None:
+        published = app.latest_release.created_at
+    elif app.latest_commit is not None and app.latest_commit.last_modified:
+        published = parsedate_to_datetime(app.latest_commit.last_modified)
+    return (
+        not app.latest_is_release,
+        published is None,
+        published.timestamp() if published else 0,
+    )
+
+
+class Deadline:
+    """Time budget of a run, with the time updates are expected to take."""
+
+    end: float
+    reserve: float
+    longest: float
+
+    def __init__(self, seconds: float):
+        """
+        Initialize a deadline, the given number of seconds from now.
+
+        Part of the budget is reserved for rendering the README, and for
+        committing and pushing, after the last update.
+        """
+        self.end = time.monotonic() + seconds
+        self.reserve = min(DEADLINE_RESERVE, seconds / 10)
+        self.longest = 0.0
+
+    def remaining(self) -> float:
+        """Return the number of seconds left."""
+        return self.end - time.monotonic()
+
+    def allows(self) -> bool:
+        """Determine whether there is time for another step of updates."""
+        return self.remaining() >= self.longest + self.reserve
+
+    def record(self, seconds: float):
+        """Record how long a step of updates took."""
+        self.longest = max(self.longest, seconds)
@@ -5,37 +5,284 @@ This module extends the main PyGitHub class in order to add some extra
 functionality.
 """
 
-from git import Repo
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+from functools import cached_property
+from urllib.parse import urlparse
+
+import click
+import crayons
+import requests
+from git import Git, Repo
+from github import Consts
 from github import Github as PyGitHub
 from github import Repository
+from github.AuthenticatedUser import AuthenticatedUser
+from github.Commit import Commit
+from github.GitRelease import GitRelease
+from github.GithubException import GithubException
+from github.Requester import Requester
+
+from .archive import extract_subtree
+from .cache import ResponseCache
+from .const import DEFAULT_REQUEST_TIMEOUT
+from .index import SourceIndex
+from .registry import Registry
+from .report import RunReport
+from .session import Session
+from .templates import TemplateEngine
+from .trace import Tracer
 
 
 class GitHub(PyGitHub):
     """Object for communicating with GitHub and cloning repositories."""
 
     token: str
+    session: Session
+    report: RunReport
+    tracer: Tracer
+    mirror_dir: str | None
+    timeout: int
 
-    def __init__(self, login_or_token=None):
+    def __init__(
+        self,
+        login_or_token=None,
+        pool_size=None,
+        base_url=Consts.DEFAULT_BASE_URL,
+        cache: ResponseCache | None = None,
+        template_dir: str | None = None,
+        mirror_dir: str | None = None,
+        timeout: int = DEFAULT_REQUEST_TIMEOUT,
+    ):
         """Initialize a new GitHub object."""
+        self.report = RunReport()
+        self.templates = TemplateEngine(template_dir)
+        self.tracer = Tracer()
+        self.session = Session(pool_size, cache, self.report, self.tracer)
+        Requester.injectConnectionClasses(*self.session.connection_classes())
+        # Requests are paced by the scheduler of the session instead
         super().__init__(
             login_or_token=login_or_token,
+            base_url=base_url,
+            timeout=timeout,
+            pool_size=pool_size,
+            seconds_between_requests=None,
+            seconds_between_writes=None,
         )
         self.token = login_or_token
+        self.timeout = timeout
+        self.mirror_dir = mirror_dir
+        self.mirror_locks = {}
+        self.mirror_locks_lock = threading.Lock()
+        # Shared by all apps during a run
+        self.repositories = Registry()
+        self.indexes = Registry()
+        self.checkouts = Registry()
+
+    @cached_property
+    def user(self) -> AuthenticatedUser:
+        """Return the authenticated user, which is only fetched once."""
+        return self.get_user()
 
-    def clone(self, repository: Repository, destination):
-        """Clones a GitHub repository and returns a Git object."""
-        environ = {
+    @property
+    def git_environ(self) -> dict:
+        """Return the environment git needs to authenticate with GitHub."""
+        return {
             "GIT_ASKPASS": "repository-updater-git-askpass",
             "GIT_USERNAME": self.token,
             "GIT_PASSWORD": "",
         }
 
-        repo = Repo.clone_from(repository.clone_url, destination, None, environ)
+    @property
+    def web_url(self) -> str:
+        """Return the URL of the GitHub web interface."""
+        if self.requester.base_url == Consts.DEFAULT_BASE_URL:
+            return "https://github.com"
+        url = urlparse(self.requester.base_url)
+        return f"{url.scheme}://{url.netloc}"
+
+    def record_rate_limits(self, moment: str):
+        """Record the current rate limits in the report, free of charge."""
+        try:
+            _, data = self.requester.requestJsonAndCheck("GET", "/rate_limit")
+        except (GithubException, requests.RequestException) as err:
+            # E.g. GitHub Enterprise servers with rate limiting disabled
+            click.echo(crayons.yellow("Could not read rate limits: %s" % err))
+            return
+        self.report.record_rate_limits(data["resources"], moment)
+
+    def make_repository(self, full_name: str, **attributes) -> Repository:
+        """Create a repository object that only fetches itself when needed."""
+        return Repository.Repository(
+            self.requester,
+            {},
+            {
+                "full_name": full_name,
+                "html_url": f"{self.web_url}/{full_name}",
+                "clone_url": f"{self.web_url}/{full_name}.git",
+                "url": f"{self.requester.base_url}/repos/{full_name}",
+                **attributes,
+            },
+            completed=False,
+        )
+
+    def make_commit(
+        self, repository: Repository, sha: str, last_modified: str | None = None
+    ) -> Commit:
+        """Create a commit object that only fetches itself when needed."""
+        return Commit(
+            self.requester,
+            {"last-modified": last_modified} if last_modified else {},
+            {"sha": sha, "url": f"{repository.url}/commits/{sha}"},
+            completed=False,
+        )
+
+    def make_release(self, repository: Repository, **attributes) -> GitRelease:
+        """Create a release object that only fetches itself when needed."""
+        return GitRelease(
+            self.requester,
+            {},
+            {"url": f"{repository.url}/releases/{attributes['id']}", **attributes},
+            completed=False,
+        )
+
+    def fingerprint(self, repository: Repository) -> str:
+        """Return a fingerprint of the default branch head, tags and releases."""
+        return self.index(repository).fingerprint
+
+    def index(self, repository: Repository) -> SourceIndex:
+        """
+        Return the tag and release index of a repository.
+
+        The index is built once per repository, from a single
+        `git ls-remote`, which does not count against the API rate limit
+        and, unlike the matching refs API, peels annotated tags.
+        """
+
+        def create():
+            with self.tracer.span(
+                "git ls-remote", "git", repository=repository.full_name
+            ):
+                refs = Git().ls_remote(
+                    repository.clone_url,
+                    "HEAD",
+                    "refs/tags/*",
+                    env=self.git_environ,
+                )
+            return SourceIndex(repository, refs)
+
+        return self.indexes.get(repository.full_name, create)
+
+    def source_repository(self, full_name: str, **known) -> Repository:
+        """
+        Return an app source repository, fetched only once per run.
+
+        When the repository attributes are known already, e.g., from a
+        previous run, they are used instead of fetching the repository.
+        """
+        if known:
+            return self.repositories.get(
+                full_name, lambda: self.make_repository(full_name=full_name, **known)
+            )
+        return self.repositories.get(full_name, lambda: self.get_repo(full_name))
+
+    def release_checkouts(self):
+        """Remove all app source checkouts shared during this run."""
+        for git_repo, source_dir in self.checkouts.clear():
+            shutil.rmtree(git_repo.working_dir if git_repo else source_dir, True)
+
+    def clone(
+        self,
+        repository: Repository,
+        destination,
+        commit: str | None = None,
+        path: str | None = None,
+    ):
+        """
+        Clones a GitHub repository and returns a Git object.
+
+        When a commit is given, only that single commit is fetched,
+        without history and with blobs downloaded on demand. When a path
+        is given as well, the checkout is limited to that directory.
+        Otherwise, when a mirror directory is configured, the repository
+        is cloned from an incrementally updated local mirror.
+        """
+        environ = self.git_environ
+
+        with self.tracer.span("git clone", "git", repository=repository.full_name):
+            if commit is None and self.mirror_dir:
+                repo = Repo.clone_from(
+                    self.update_mirror(repository, environ), destination, None, environ
+                )
+                repo.remote().set_url(repository.clone_url)
+            elif commit is None:
+                repo = Repo.clone_from(repository.clone_url, destination, None, environ)
+            else:
+                repo = Repo.init(destination)
+                repo.git.update_environment(**environ)
+                repo.create_remote("origin", repository.clone_url)
+                if path and path.strip("/") not in ("", "."):
+                    repo.git.sparse_checkout("set", path.strip("/"))
+                repo.git.fetch("--depth=1", "--filter=blob:none", "origin", commit)
+                repo.git.checkout(commit)
 
         config = repo.config_writer()
-        if self.get_user().email:
-            config.set_value("user", "email", self.get_user().email)
-        config.set_value("user", "name", self.get_user().name)
+        if self.user.email:
+            config.set_value("user", "email", self.user.email)
+        config.set_value("user", "name", self.user.name)
         config.set_value("commit", "gpgsign", "false")
+        config.release()
 
         return repo
+
+    def update_mirror(self, repository: Repository, environ: dict) -> str:
+        """Create or fetch new objects into the local mirror of a repository."""
+        path = os.path.join(self.mirror_dir, repository.full_name + ".git")
+        with self.mirror_locks_lock:
+            lock = self.mirror_locks.setdefault(path, threading.Lock())
+
+        with lock, self.tracer.span(
+            "git mirror", "git", repository=repository.full_name
+        ):
+            if os.path.exists(path):
+                mirror = Repo(path)
+                mirror.git.update_environment(**environ)
+                mirror.remote().set_url(repository.clone_url)
+                mirror.git.fetch("--prune", "origin")
+            else:
+                Repo.clone_from(repository.clone_url, path, None, environ, mirror=True)
+        return path
+
+    def download_archive(
+        self, repository: Repository, commit: str, path: str, destination
+    ) -> int:
+        """
+        Download a single directory of a repository at the given commit.
+
+        The tarball of the commit is streamed and only the files below
+        the given path are extracted, directly into the destination.
+        """
+        url = f"{repository.url}/tarball/{commit}"
+        with self.tracer.span("download archive", "http", url=url):
+            start = time.monotonic()
+            response = self.session.http.get(
+                url,
+                headers={"Authorization": f"token {self.token}"},
+                stream=True,
+                timeout=self.timeout,
+            )
+            self.report.record(
+                "GET",
+                url,
+                response.status_code,
+                int(response.headers.get("Content-Length", 0)),
+                time.monotonic() - start,
+            )
+            response.raise_for_status()
+            with response:
+                response.raw.decode_content = True
+                return extract_subtree(response.raw, path, destination)
@@ -0,0 +1,165 @@
+"""
+Index module.
+
+Indexes the tags and releases of an app source repository once, so
+looking up versions, commits and the latest release for a channel does
+not need an API request each.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from typing import Callable
+
+import semver
+from github.GitRelease import GitRelease
+from github.GithubException import UnknownObjectException
+from github.Repository import Repository
+
+from .const import CHANNEL_BETA
+
+
+def find_latest_release(
+    releases, channel: str, usable: Callable[[GitRelease], bool] | None = None
+) -> GitRelease | None:
+    """
+    Return the first published release in the given releases for a channel.
+
+    Releases that are not usable according to the given check, if any,
+    are skipped as well.
+    """
+    for release in releases:
+        prerelease = (
+            release.prerelease
+            or semver.parse_version_info(release.tag_name.lstrip("v")).prerelease
+        )
+        if release.draft or (prerelease and channel != CHANNEL_BETA):
+            continue
+        if usable is not None and not usable(release):
+            continue
+        return release
+    return None
+
+
+class SourceIndex:
+    """Tags, default branch head and releases of an app source repository."""
+
+    repository: Repository
+    refs_fingerprint: str
+    head: str | None
+    tags: dict[str, str]
+
+    def __init__(self, repository: Repository, refs: str):
+        """
+        Initialize a new index from `git ls-remote` output.
+
+        The refs are expected to hold `HEAD` and all tags, including the
+        peeled (`^{}`) entries of annotated tags.
+        """
+        self.repository = repository
+        self.refs_fingerprint = hashlib.sha256(refs.encode("utf8")).hexdigest()
+        self.head = None
+        self.tags = {}
+        for line in refs.splitlines():
+            sha, _, ref = line.partition("\t")
+            if ref == "HEAD":
+                self.head = sha
+            elif ref.startswith("refs/tags/"):
+                tag = ref[len("refs/tags/") :]
+                if tag.endswith("^{}"):
+                    self.tags[tag[:-3]] = sha
+                else:
+                    # Annotated tags are peeled by the ^{} entry that follows
+                    self.tags.setdefault(tag, sha)
+        self.lock = threading.Lock()
+        self.releases = None
+        self.fetched = []
+        self.latest = {}
+        self.releases_fingerprint = None
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Return a fingerprint of the default branch head, tags and releases.
+
+        Publishing a release on an existing tag, or promoting a prerelease,
+        does not change any ref, so the first page of releases is part of
+        it as well. That page is requested once, conditionally when API
+        responses are cached, and shared with listing the releases.
+        """
+        if self.releases_fingerprint is None:
+            _, data = self.repository.requester.requestJsonAndCheck(
+                "GET", f"{self.repository.url}/releases"
+            )
+            releases = [
+                [
+                    release["id"],
+                    release["tag_name"],
+                    release["draft"],
+                    release["prerelease"],
+                ]
+                for release in data
+            ]
+            with self.lock:
+                self.releases_fingerprint = hashlib.sha256(
+                    json.dumps(releases).encode("utf8")
+                ).hexdigest()
+        return f"{self.refs_fingerprint}:{self.releases_fingerprint}"
+
+    def tag_commit(self, version: str) -> str | None:
+        """Return the commit of a version, tagged with or without a `v`."""
+        for tag in (version, f"v{version}"):
+            if tag in self.tags:
+                return self.tags[tag]
+        return None
+
+    def release_commit(self, tag: str) -> str | None:
+        """
+        Return the commit a release tag points to.
+
+        Releases are fetched after the tags were listed, so a tag that
+        was created since is looked up using the API. Returns None when
+        the tag does not exist (anymore).
+        """
+        with self.lock:
+            if tag in self.tags:
+                return self.tags[tag]
+        try:
+            target = self.repository.get_git_ref(f"tags/{tag}").object
+            if target.type == "tag":
+                target = self.repository.get_git_tag(target.sha).object
+            sha = target.sha
+        except UnknownObjectException:
+            sha = None
+        with self.lock:
+            if sha is not None:
+                self.tags[tag] = sha
+        return sha
+
+    def iter_releases(self):
+        """Yield all releases, newest first, fetching each page only once."""
+        index = 0
+        while True:
+            with self.lock:
+                if index >= len(self.fetched):
+                    if self.releases is None:
+                        self.releases = iter(self.repository.get_releases())
+                    release = next(self.releases, None)
+                    if release is None:
+                        return
+                    self.fetched.append(release)
+                release = self.fetched[index]
+            yield release
+            index += 1
+
+    def latest_release(self, channel: str) -> GitRelease | None:
+        """Return the latest release published on a channel."""
+        if channel not in self.latest:
+            self.latest[channel] = find_latest_release(
+                self.iter_releases(),
+                channel,
+                lambda release: self.release_commit(release.tag_name) is not None,
+            )
+        return self.latest[channel]
@@ -0,0 +1,83 @@
+"""
+Output module.
+
+Keeps console output of work running concurrently in worker threads
+grouped per task, so it can be written out in a deterministic order.
+"""
+
+import sys
+import threading
+from contextlib import contextmanager
+from io import StringIO
+
+
+class GroupedOutput:
+    """Redirects standard output of worker threads into per-task buffers."""
+
+    def __init__(self):
+        """Initialize a new grouped output redirection."""
+        self.stream = None
+        self.local = threading.local()
+
+    def __enter__(self):
+        """Start redirecting standard output of tasks."""
+        self.stream = sys.stdout
+        sys.stdout = self
+        return self
+
+    def __exit__(self, *args):
+        """Restore the original standard output."""
+        sys.stdout = self.stream
+
+    def __getattr__(self, name):
+        """Proxy everything else (encoding, isatty, ...) to the real stream."""
+        return getattr(self.stream, name)
+
+    @contextmanager
+    def capture(self, buffer: StringIO):
+        """Capture all output of the current thread into the given buffer."""
+        self.local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self.local.buffer = None
+
+    def write(self, text):
+        """Write to the buffer of the current task, if any."""
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is not None:
+            return buffer.write(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        """Flush the real stream, buffers are flushed when written out."""
+        if getattr(self.local, "buffer", None) is None:
+            self.stream.flush()
+
+    def run_all(self, executor, func, items):
+        """
+        Run func for all items using the executor, yielding in order.
+
+        The output of each task is written out as one group once all
+        tasks before it are done. Exceptions (including SystemExit) are
+        raised in the calling thread, after the output of the failing
+        task has been written.
+        """
+
+        def task(item, buffer):
+            with self.capture(buffer):
+                return func(*item)
+
+        buffers = [StringIO() for _ in items]
+        futures = [
+            executor.submit(task, item, buffer) for item, buffer in zip(items, buffers)
+        ]
+        for future, buffer in zip(futures, buffers):
+            exception = future.exception()
+            self.stream.write(buffer.getvalue())
+            self.stream.flush()
+            if exception is not None:
+                for pending in futures:
+                    pending.cancel()
+                raise exception
+            yield future.result()
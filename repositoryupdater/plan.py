@@ -0,0 +1,236 @@
+"""
+Plan module.
+
+Splits a run over multiple machines. Each shard resolves and prepares
+the updates of its part of the apps, and writes them to a plan file;
+a final step applies all plans to the app repository at once, renders
+the README and pushes.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List
+
+import click
+import crayons
+
+from .const import BATCH_COMBINED
+from .output import GroupedOutput
+from .publisher import MODE_EXECUTABLE, MODE_FILE
+
+if TYPE_CHECKING:
+    from .repository import Repository
+
+PLAN_VERSION = 2
+
+
+def in_shard(target: str, index: int, count: int) -> bool:
+    """
+    Determine whether an app belongs to a shard (numbered from 1).
+
+    Apps are assigned by a hash of their target, so an app stays in the
+    same shard when other apps are added or removed.
+    """
+    digest = hashlib.sha256(target.encode("utf8")).hexdigest()
+    return int(digest, 16) % count == index - 1
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse a shard given as `<index>/<count>`, e.g., `1/4`."""
+    index, _, count = value.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        raise ValueError(f'Invalid shard "{value}", expected e.g. 1/4') from None
+    if not 1 <= shard[0] <= shard[1]:
+        raise ValueError(f'Invalid shard "{value}", expected e.g. 1/4')
+    return shard
+
+
+def create_plan(repository: Repository) -> dict:
+    """Prepare the updates of all loaded apps and return them as a plan."""
+    pending = [app for app in repository.apps if app.needs_update(repository.force)]
+    if repository.concurrency > 1 and len(pending) > 1:
+        with GroupedOutput() as output, ThreadPoolExecutor(
+            max_workers=repository.concurrency
+        ) as executor:
+            staged = list(
+                output.run_all(
+                    executor, repository.prepare_app, [(app,) for app in pending]
+                )
+            )
+    else:
+        staged = [repository.prepare_app(app) for app in pending]
+
+    apps = []
+    for app in staged:
+        files = {}
+        for path in sorted(app.written):
+            local_file = os.path.join(app.app_dir, *path.split("/"))
+            planned = None
+            if os.path.isfile(local_file):
+                with open(local_file, "rb") as f:
+                    planned = {
+                        "content": base64.b64encode(f.read()).decode("ascii"),
+                        "mode": (
+                            MODE_EXECUTABLE
+                            if os.access(local_file, os.X_OK)
+                            else MODE_FILE
+                        ),
+                    }
+            files[posixpath.join(app.repository_target, path)] = planned
+        if app.fingerprint is None:
+            app.fingerprint = repository.github.fingerprint(app.app_repository)
+        state = app.get_state()
+        if state is not None:
+            state["source"] = repository.apps_config[app.repository_target][
+                "repository"
+            ]
+        apps.append(
+            {
+                "target": app.repository_target,
+                "message": repository.commit_message(app),
+                "files": files,
+                "state": state,
+            }
+        )
+        shutil.rmtree(os.path.dirname(app.staging_dir), True)
+
+    return {
+        "version": PLAN_VERSION,
+        "repository": repository.github_repository.full_name,
+        "head": repository.head,
+        "shard": list(repository.shard) if repository.shard else None,
+        "apps": apps,
+    }
+
+
+def save_plan(plan: dict, path: str):
+    """Write a plan to a file."""
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(plan, f, indent=2, default=str)
+
+
+def load_plan(path: str) -> dict:
+    """Read a plan from a file, making sure it can be applied."""
+    with open(path, encoding="utf8") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version in {path}")
+    return plan
+
+
+def check_shards(plans: List[dict]):
+    """
+    Make sure the plans are of all shards of a single split, once each.
+
+    Applying only some of the shards would leave the apps of the missing
+    ones out of the run without notice.
+    """
+    shards = [tuple(plan["shard"] or (1, 1)) for plan in plans]
+    counts = {count for _, count in shards}
+    if len(counts) != 1:
+        raise ValueError(
+            "Plans are of different splits: %s"
+            % ", ".join("%d/%d" % shard for shard in shards)
+        )
+    count = counts.pop()
+    indexes = sorted(index for index, _ in shards)
+    duplicates = sorted({index for index in indexes if indexes.count(index) > 1})
+    if duplicates:
+        raise ValueError(
+            "Shards planned more than once: %s"
+            % ", ".join("%d/%d" % (index, count) for index in duplicates)
+        )
+    missing = sorted(set(range(1, count + 1)) - set(indexes))
+    if missing:
+        raise ValueError(
+            "Plans of shards missing: %s"
+            % ", ".join("%d/%d" % (index, count) for index in missing)
+        )
+
+
+def write_files(directory: str, files: dict):
+    """Write planned files into a directory, with their modes."""
+    for path, planned in files.items():
+        local_file = os.path.join(directory, *path.split("/"))
+        if planned is None:
+            if os.path.lexists(local_file):
+                os.remove(local_file)
+            continue
+        os.makedirs(os.path.dirname(local_file), exist_ok=True)
+        with open(local_file, "wb") as f:
+            f.write(base64.b64decode(planned["content"]))
+        os.chmod(local_file, 0o755 if planned["mode"] == MODE_EXECUTABLE else 0o644)
+
+
+def apply_plans(repository: Repository, plans: List[dict]) -> bool:
+    """
+    Apply the planned updates to the app repository and commit them.
+
+    The README is rendered once, after all updates are applied. Returns
+    whether anything was committed.
+    """
+    planned = {}
+    for plan in plans:
+        if plan["repository"] != repository.github_repository.full_name:
+            raise ValueError(
+                'Plan is for repository "%s", not "%s"'
+                % (plan["repository"], repository.github_repository.full_name)
+            )
+        if plan["head"] != repository.head:
+            click.echo(
+                crayons.yellow(
+                    "App repository changed since planning shard %s, "
+                    "applying anyway" % "/".join(map(str, plan["shard"] or ["-"]))
+                )
+            )
+        for app in plan["apps"]:
+            if app["target"] in planned:
+                raise ValueError(f'App "{app["target"]}" is planned more than once')
+            planned[app["target"]] = app
+
+    committed = False
+    messages = []
+    for target in sorted(planned):
+        app = planned[target]
+        click.echo(crayons.green("-" * 50, bold=True))
+        click.echo(crayons.green(f"Applying update of app {target}"))
+        write_files(repository.working_dir, app["files"])
+        repository.state.record(target, app["state"])
+        messages.append(app["message"])
+        if repository.batch != BATCH_COMBINED:
+            committed = (
+                repository.commit_paths(list(app["files"]), app["message"]) or committed
+            )
+
+    # Reload the applied apps, so the README uses their new versions
+    for index, loaded in enumerate(repository.apps):
+        if loaded.repository_target in planned:
+            repository.apps[index] = repository.load_local_app(
+                loaded.repository_target,
+                repository.apps_config[loaded.repository_target],
+            )
+
+    repository.generate_readme()
+    if repository.batch == BATCH_COMBINED and messages:
+        paths = ["README.md"]
+        for app in planned.values():
+            paths.extend(app["files"])
+        committed = (
+            repository.commit_paths(paths, repository.batch_message(messages))
+            or committed
+        )
+    else:
+        committed = (
+            repository.commit_paths(["README.md"], ":books: Updated README")
+            or committed
+        )
+    return committed
@@ -0,0 +1,355 @@
+"""
+Publisher module.
+
+Publishes changes to the apps repository through the Git Data API,
+without cloning it. Only the files the updater needs to read are
+downloaded; everything else is represented by empty placeholders.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import posixpath
+import shutil
+import tempfile
+from typing import List
+
+import click
+import crayons
+from git.exc import GitCommandError
+from github.GitCommit import GitCommit
+from github.GitTree import GitTree
+from github.GithubException import GithubException
+from github.InputGitTreeElement import InputGitTreeElement
+from github.Repository import Repository
+
+from .const import CONFIG_FILES, DEFAULT_MAX_CHANGES
+from .github import GitHub
+from .templates import is_template
+
+MODE_FILE = "100644"
+MODE_EXECUTABLE = "100755"
+MODE_SYMLINK = "120000"
+
+
+class TreeUnavailable(Exception):
+    """Raised when the tree of the repository cannot be read in one go."""
+
+
+class PushRejected(Exception):
+    """Raised when a push is rejected, because the branch moved on."""
+
+
+class RebaseConflict(Exception):
+    """Raised when local commits cannot be replayed onto the branch."""
+
+
+def is_rejected(err: GitCommandError) -> bool:
+    """Determine whether a failed git push was rejected as not fast-forward."""
+    return "[rejected]" in str(err.stderr)
+
+
+def blob_sha(content: bytes) -> str:
+    """Return the git object id of a blob with the given content."""
+    return hashlib.sha1(b"blob %d\0%s" % (len(content), content)).hexdigest()
+
+
+class ApiPublisher:
+    """Partial checkout of the apps repository, published using the API."""
+
+    github: GitHub
+    repository: Repository
+    working_dir: str
+    max_changes: int
+    head: str | None
+    entries: dict[str, tuple[str, str]]
+    base: dict[str, tuple[str, str]]
+
+    def __init__(
+        self,
+        github: GitHub,
+        repository: Repository,
+        working_dir: str,
+        max_changes: int = DEFAULT_MAX_CHANGES,
+    ):
+        """Initialize a new publisher, checking out into the working directory."""
+        self.github = github
+        self.repository = repository
+        self.working_dir = working_dir
+        self.max_changes = max_changes
+        self.head = None
+        self.tree = None
+        self.entries = {}
+        self.base = {}
+        self.placeholders = {}
+        self.commits = []
+
+    def checkout(self) -> bool:
+        """
+        Check out the head of the default branch, discarding local changes.
+
+        Returns whether the head changed since the previous checkout.
+        Raises `TreeUnavailable` when the tree is too large to be listed.
+        """
+        ref = self.repository.get_git_ref(f"heads/{self.repository.default_branch}")
+        head = ref.object.sha
+        changed = head != self.head
+
+        commit = self.repository.get_git_commit(head)
+        tree = self.repository.get_git_tree(commit.tree.sha, recursive=True)
+        if tree.raw_data.get("truncated"):
+            raise TreeUnavailable(f"Tree of {self.repository.full_name} is truncated")
+
+        shutil.rmtree(self.working_dir, True)
+        os.makedirs(self.working_dir)
+        self.head = head
+        self.tree = tree.sha
+        self.entries = {}
+        self.placeholders = {}
+        self.commits = []
+        blobs = {}
+        for element in tree.tree:
+            if element.type != "blob":
+                continue
+            self.entries[element.path] = (element.mode, element.sha)
+            path = os.path.join(self.working_dir, *element.path.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if is_template(element.path) or (
+                posixpath.basename(element.path) in CONFIG_FILES
+            ):
+                if element.sha not in blobs:
+                    blob = self.repository.get_git_blob(element.sha)
+                    blobs[element.sha] = base64.b64decode(blob.content)
+                with open(path, "wb") as f:
+                    f.write(blobs[element.sha])
+            else:
+                open(path, "wb").close()
+                self.placeholders[element.path] = self.stat(path)
+            if element.mode == MODE_EXECUTABLE:
+                os.chmod(path, 0o755)
+        self.base = dict(self.entries)
+        return changed
+
+    def rebase(self) -> set[str]:
+        """
+        Replay the recorded commits onto the head of the default branch.
+
+        Changes to the README are dropped, as it is rendered again after
+        rebasing. Returns the paths that were changed upstream. Raises
+        `RebaseConflict` when a path was changed differently upstream.
+        """
+        base = self.base
+        commits = self.commits
+        self.checkout()
+        upstream = {
+            path
+            for path in base.keys() | self.entries.keys()
+            if base.get(path) != self.entries.get(path)
+        }
+
+        result = {}
+        for _, changes in commits:
+            for path, change in changes.items():
+                result[path] = change and (change[0], change[2])
+        conflicts = sorted(
+            path
+            for path, entry in result.items()
+            if path in upstream
+            and path != "README.md"
+            and entry != self.entries.get(path)
+        )
+        if conflicts:
+            raise RebaseConflict("Changed upstream: %s" % ", ".join(conflicts))
+
+        for message, changes in commits:
+            paths = [path for path in changes if path != "README.md"]
+            for path in paths:
+                local = os.path.join(self.working_dir, *path.split("/"))
+                if changes[path] is None:
+                    if os.path.lexists(local):
+                        os.remove(local)
+                    continue
+                mode, content, _ = changes[path]
+                os.makedirs(os.path.dirname(local), exist_ok=True)
+                with open(local, "wb") as f:
+                    f.write(content)
+                os.chmod(local, 0o755 if mode == MODE_EXECUTABLE else 0o644)
+            self.commit(paths, message)
+        return upstream
+
+    @staticmethod
+    def stat(path: str) -> tuple[int, int]:
+        """Return what identifies a placeholder that was not written to."""
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def changes(self, paths: List[str]) -> dict:
+        """
+        Return the changes of the given paths, compared to the tree.
+
+        Changes map a path to its mode, content and blob sha, or to None
+        when it was removed. Directories include all files below them.
+        """
+        changes = {}
+
+        def remove(prefix):
+            for path in self.entries:
+                if path == prefix or path.startswith(prefix + "/"):
+                    changes[path] = None
+
+        for prefix in paths:
+            local = os.path.join(self.working_dir, *prefix.split("/"))
+            if os.path.isdir(local):
+                remove(prefix)
+                for root, _, files in os.walk(local):
+                    for file in files:
+                        full = os.path.join(root, file)
+                        path = posixpath.join(
+                            prefix, *os.path.relpath(full, local).split(os.sep)
+                        )
+                        changes.pop(path, None)
+                        self.add_change(changes, path, full)
+            elif os.path.isfile(local):
+                self.add_change(changes, prefix, local)
+            else:
+                remove(prefix)
+        return changes
+
+    def add_change(self, changes: dict, path: str, local: str):
+        """Add a file to the changes, unless it is unchanged."""
+        if path in self.placeholders and self.placeholders[path] == self.stat(local):
+            return
+        with open(local, "rb") as f:
+            content = f.read()
+        mode = MODE_EXECUTABLE if os.access(local, os.X_OK) else MODE_FILE
+        sha = blob_sha(content)
+        if self.entries.get(path) != (mode, sha):
+            changes[path] = (mode, content, sha)
+
+    def commit(self, paths: List[str], message: str) -> bool:
+        """Record a commit of the given paths, to be created when pushing."""
+        changes = self.changes(paths)
+        if not changes:
+            return False
+        for path, change in changes.items():
+            self.placeholders.pop(path, None)
+            if change is None:
+                del self.entries[path]
+            else:
+                self.entries[path] = (change[0], change[2])
+        self.commits.append((message, changes))
+        return True
+
+    def push(self):
+        """Create all recorded commits and fast-forward the branch to them."""
+        changed = set()
+        for _, changes in self.commits:
+            changed.update(changes)
+        if len(changed) > self.max_changes:
+            click.echo(
+                crayons.yellow("%d changed files, pushing using git..." % len(changed)),
+                nl=False,
+            )
+            self.push_using_git()
+        else:
+            self.push_using_api()
+        self.commits = []
+
+    def push_using_api(self):
+        """Create blobs, trees and commits, then update the branch."""
+        tree = self.tree
+        parent = self.head
+        for message, changes in self.commits:
+            elements = []
+            for path, change in sorted(changes.items()):
+                if change is None:
+                    elements.append(
+                        InputGitTreeElement(path, MODE_FILE, "blob", sha=None)
+                    )
+                    continue
+                mode, content, _ = change
+                try:
+                    elements.append(
+                        InputGitTreeElement(
+                            path, mode, "blob", content=content.decode("utf-8")
+                        )
+                    )
+                except UnicodeDecodeError:
+                    blob = self.repository.create_git_blob(
+                        base64.b64encode(content).decode("ascii"), "base64"
+                    )
+                    elements.append(
+                        InputGitTreeElement(path, mode, "blob", sha=blob.sha)
+                    )
+            tree = self.repository.create_git_tree(
+                elements, self.make_object(GitTree, tree)
+            ).sha
+            parent = self.repository.create_git_commit(
+                message,
+                self.make_object(GitTree, tree),
+                [self.make_object(GitCommit, parent)],
+            ).sha
+
+        ref = self.repository.get_git_ref(f"heads/{self.repository.default_branch}")
+        try:
+            ref.edit(parent)
+        except GithubException as err:
+            if err.status == 422:
+                raise PushRejected(str(err)) from err
+            raise
+        self.head = parent
+        self.tree = tree
+
+    def push_using_git(self):
+        """
+        Replay all recorded commits on a clone, and push that.
+
+        Raises `PushRejected` when the branch moved on since the checkout,
+        so the commits are rebased, checking for conflicts, first.
+        """
+        directory = tempfile.mkdtemp(prefix="repoupdater")
+        try:
+            repo = self.github.clone(self.repository, directory)
+            if repo.head.commit.hexsha != self.head:
+                raise PushRejected(
+                    "Branch moved on to %s since %s"
+                    % (repo.head.commit.hexsha[:7], (self.head or "-")[:7])
+                )
+            for message, changes in self.commits:
+                for path, change in changes.items():
+                    local = os.path.join(directory, *path.split("/"))
+                    if change is None:
+                        if os.path.lexists(local):
+                            os.remove(local)
+                        continue
+                    os.makedirs(os.path.dirname(local), exist_ok=True)
+                    with open(local, "wb") as f:
+                        f.write(change[1])
+                    os.chmod(local, 0o755 if change[0] == MODE_EXECUTABLE else 0o644)
+                removed = [path for path, change in changes.items() if change is None]
+                if len(removed) < len(changes):
+                    repo.git.add(
+                        "--all",
+                        "--",
+                        *(path for path in changes if path not in removed),
+                    )
+                if removed:
+                    repo.git.rm("-q", "--cached", "--ignore-unmatch", "--", *removed)
+                if repo.is_dirty(index=True, working_tree=False):
+                    repo.git.commit("--no-gpg-sign", "-m", message)
+            try:
+                repo.git.push()
+            except GitCommandError as err:
+                if is_rejected(err):
+                    raise PushRejected(str(err)) from err
+                raise
+            self.head = repo.head.commit.hexsha
+            self.tree = repo.head.commit.tree.hexsha
+        finally:
+            shutil.rmtree(directory, True)
+
+    def make_object(self, cls, sha: str):
+        """Create a git object that is only used to refer to its sha."""
+        return cls(self.github.requester, {}, {"sha": sha}, completed=True)
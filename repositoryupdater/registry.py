@@ -0,0 +1,44 @@
+"""
+Registry module.
+
+Keeps what is shared between apps during a run, like source repositories
+and their checkouts, so apps that use the same source repository or
+commit do not each fetch it again.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class Registry:
+    """Values that are created only once per key, even by concurrent threads."""
+
+    values: dict
+
+    def __init__(self):
+        """Initialize a new, empty registry."""
+        self.values = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, create: Callable[[], T]) -> T:
+        """Return the value of a key, creating it when it does not exist yet."""
+        with self.lock:
+            lock = self.locks.setdefault(key, threading.Lock())
+
+        with lock:
+            if key not in self.values:
+                self.values[key] = create()
+            return self.values[key]
+
+    def clear(self) -> list:
+        """Remove and return all values."""
+        with self.lock:
+            values = list(self.values.values())
+            self.values = {}
+            self.locks = {}
+        return values
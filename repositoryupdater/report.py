@@ -0,0 +1,184 @@
+"""
+Report module.
+
+Accounts for every GitHub API request made during a run, per endpoint,
+app and phase, so it is clear where the rate limit budget goes.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+PHASE_SETUP = "setup"
+PHASE_LOAD = "load"
+PHASE_UPDATE = "update"
+PHASE_PUSH = "push"
+
+GIT_REFS = ("ref", "refs", "matching-refs")
+SHA = re.compile(r"^[0-9a-f]{40}$")
+
+
+def endpoint(url: str) -> str:
+    """Return the endpoint of a request URL, with its parameters replaced."""
+    parts = urlparse(url).path.strip("/").split("/")
+    if parts[:1] == ["api"] and parts[1:2] == ["v3"]:
+        # GitHub Enterprise serves the API below /api/v3
+        parts = parts[2:]
+    if parts[:1] == ["repos"] and len(parts) >= 3:
+        parts[1:3] = ["{owner}", "{repo}"]
+        if parts[3:4] == ["git"] and len(parts) > 4 and parts[4] in GIT_REFS:
+            parts[5:] = ["{ref}"] if len(parts) > 5 else []
+        elif parts[3:4] in (["commits"], ["compare"], ["tarball"], ["zipball"]):
+            parts[4:] = ["{ref}"] if len(parts) > 4 else []
+        elif parts[3:4] == ["contents"]:
+            parts[4:] = ["{path}"] if len(parts) > 4 else []
+        elif parts[3:5] == ["releases", "tags"]:
+            parts[5:] = ["{tag}"] if len(parts) > 5 else []
+    elif parts[:1] == ["users"] and len(parts) >= 2:
+        parts[1] = "{user}"
+    return "/" + "/".join(
+        "{sha}" if SHA.match(part) else "{id}" if part.isdigit() else part
+        for part in parts
+    )
+
+
+class RunReport:
+    """Collects the cost of all GitHub API requests made during a run."""
+
+    phase: str
+
+    def __init__(self):
+        """Initialize a new, empty run report."""
+        self.started = datetime.now(timezone.utc)
+        self.phase = PHASE_SETUP
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = defaultdict(Counter)
+        self.requests = Counter()
+        self.rate_limit = {}
+
+    @contextmanager
+    def app(self, target: str):
+        """Account all requests of the current thread to the given app."""
+        previous = getattr(self.local, "app", None)
+        self.local.app = target
+        try:
+            yield
+        finally:
+            self.local.app = previous
+
+    def record(
+        self,
+        verb: str,
+        url: str,
+        status: int,
+        size: int,
+        elapsed: float,
+        not_modified: bool = False,
+        retry: bool = False,
+    ):
+        """Record a single request and its response."""
+        if url.endswith("/rate_limit"):
+            # Only requested for this report, and free of charge
+            return
+        app = getattr(self.local, "app", None)
+        stat = {
+            "requests": 1,
+            "bytes": size,
+            "elapsed": elapsed,
+            "not_modified": int(not_modified),
+            "errors": int(status >= 400),
+            "retries": int(retry),
+        }
+        with self.lock:
+            for key in (
+                ("total",),
+                ("endpoint", verb, endpoint(url)),
+                ("app", app),
+                ("phase", self.phase),
+            ):
+                self.stats[key].update(stat)
+            self.requests[(verb, url)] += 1
+
+    def record_rate_limits(self, resources: dict, moment: str):
+        """
+        Record the rate limits as reported by `GET /rate_limit`.
+
+        The moment is either `before` or `after` the run; the difference
+        is what the run consumed, as long as no limit reset in between.
+        """
+        with self.lock:
+            for resource, limit in resources.items():
+                self.rate_limit.setdefault(resource, {})[moment] = {
+                    "limit": limit["limit"],
+                    "remaining": limit["remaining"],
+                    "reset": datetime.fromtimestamp(
+                        limit["reset"], timezone.utc
+                    ).isoformat(),
+                }
+
+    def rate_limit_usage(self) -> dict:
+        """Return the consumption of all rate limits that were used."""
+        usage = {}
+        for resource, moments in self.rate_limit.items():
+            before = moments.get("before")
+            after = moments.get("after")
+            if before is None or after is None:
+                continue
+            if before["reset"] != after["reset"]:
+                # The limit reset during the run, so only a lower bound is known
+                usage[resource] = {
+                    "before": before,
+                    "after": after,
+                    "used": None,
+                    "used_at_least": after["limit"] - after["remaining"],
+                }
+            elif before["remaining"] != after["remaining"]:
+                usage[resource] = {
+                    "before": before,
+                    "after": after,
+                    "used": before["remaining"] - after["remaining"],
+                }
+        return usage
+
+    def to_dict(self) -> dict:
+        """Return the report as a JSON serializable dictionary."""
+
+        def group(kind):
+            return {
+                key[1]: dict(stat)
+                for key, stat in self.stats.items()
+                if key[0] == kind and key[1] is not None
+            }
+
+        endpoints = [
+            {"method": key[1], "endpoint": key[2], **stat}
+            for key, stat in self.stats.items()
+            if key[0] == "endpoint"
+        ]
+        duplicates = [
+            {"method": verb, "url": url, "count": count}
+            for (verb, url), count in self.requests.most_common()
+            if count > 1 and verb == "GET"
+        ]
+        return {
+            "started": self.started.isoformat(),
+            "duration": (datetime.now(timezone.utc) - self.started).total_seconds(),
+            "totals": dict(self.stats[("total",)]),
+            "rate_limit": self.rate_limit_usage(),
+            "phases": group("phase"),
+            "apps": group("app"),
+            "endpoints": sorted(endpoints, key=lambda stat: -stat["requests"]),
+            "duplicates": duplicates,
+        }
+
+    def save(self, path: str):
+        """Write the report as JSON to the given file."""
+        with self.lock, open(path, "w", encoding="utf8") as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -4,85 +4,487 @@ Repository module.
 Contains the apps repository representation / configuration
 and handles the automated maintenance / updating of it.
 """
+
+from __future__ import annotations
+
 import os
+import posixpath
+import random
 import shutil
 import sys
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 import click
 import crayons
 import yaml
 from git import Repo
+from git.exc import GitCommandError
 from github.GithubException import UnknownObjectException
 from github.Repository import Repository as GitHubRepository
-from jinja2 import Environment, FileSystemLoader
 
-from .app import App
-from .const import CHANNELS
+from .app import App, LazyApp, read_config
+from .const import (
+    BATCH_COMBINED,
+    CHANNELS,
+    DEFAULT_CHANGELOG_LIMIT,
+    DEFAULT_MAX_CHANGES,
+    DEFAULT_PUSH_ATTEMPTS,
+    PUBLISH_API,
+    PUBLISH_GIT,
+    PUSH_BACKOFF_BASE,
+    PUSH_BACKOFF_MAX,
+    REPOSITORY_CONFIG_FILES,
+    SOURCE_CLONE,
+)
+from .deadline import Deadline, priority
 from .github import GitHub
+from .output import GroupedOutput
+from .plan import in_shard
+from .publisher import (
+    ApiPublisher,
+    PushRejected,
+    RebaseConflict,
+    TreeUnavailable,
+    is_rejected,
+)
+from .report import PHASE_LOAD, PHASE_PUSH, PHASE_UPDATE
+from .resolver import GraphQLResolver, ResolvedApp
+from .state import RunState
 
 
 class Repository:
     """Represents an Home Assistant apps repository."""
 
     apps: List[App]
+    apps_config: dict
     github: GitHub
     github_repository: GitHubRepository
-    git_repo: Repo
+    git_repo: Repo | None
+    publisher: ApiPublisher | None
     force: bool
     channel: str
-
-    def __init__(self, github: GitHub, repository: str, app: str, force: bool):
+    concurrency: int
+    graphql: bool
+    app_source: str
+    state: RunState | None
+    batch: str | None
+    publish: str
+    max_changes: int
+    changelog_limit: int
+    shard: tuple[int, int] | None
+    lazy: bool
+    push_attempts: int
+    deadline: Deadline | None
+    deferred: List[App]
+
+    def __init__(
+        self,
+        github: GitHub,
+        repository: str,
+        app: str,
+        force: bool,
+        concurrency: int = 1,
+        graphql: bool = False,
+        app_source: str = SOURCE_CLONE,
+        state: RunState | None = None,
+        batch: str | None = None,
+        publish: str = PUBLISH_GIT,
+        max_changes: int = DEFAULT_MAX_CHANGES,
+        changelog_limit: int = DEFAULT_CHANGELOG_LIMIT,
+        shard: tuple[int, int] | None = None,
+        lazy: bool = False,
+        push_attempts: int = DEFAULT_PUSH_ATTEMPTS,
+        deadline: Deadline | None = None,
+    ):
         """Initialize new app Repository object."""
         self.github = github
         self.force = force
+        self.concurrency = concurrency
+        self.graphql = graphql
+        self.app_source = app_source
+        self.state = state
+        self.batch = batch
+        self.publish = publish
+        self.max_changes = max_changes
+        self.changelog_limit = changelog_limit
+        self.shard = shard
+        self.lazy = lazy
+        self.push_attempts = push_attempts
+        self.deadline = deadline
+        self.publisher = None
         self.apps = []
+        self.deferred = []
+        self.github.report.phase = PHASE_LOAD
 
-        click.echo(
-            'Locating app repository "%s"...' % crayons.yellow(repository), nl=False
-        )
-        self.github_repository = github.get_repo(repository)
-        click.echo(crayons.green("Found!"))
+        with self.github.tracer.span(PHASE_LOAD, "phase"):
+            click.echo(
+                'Locating app repository "%s"...' % crayons.yellow(repository),
+                nl=False,
+            )
+            self.github_repository = github.get_repo(repository)
+            click.echo(crayons.green("Found!"))
 
-        self.clone_repository()
-        self.load_repository(app)
+            self.clone_repository()
+            self.load_repository(app)
 
     def update(self):
         """Update this repository using configuration and data gathered."""
-        self.generate_readme()
-        needs_push = self.commit_changes(":books: Updated README")
+        try:
+            self.update_apps()
+        finally:
+            self.github.release_checkouts()
+            self.github.templates.save()
+
+    def update_apps(self):
+        """Update all apps that need an update, commit and push them."""
+        self.github.report.phase = PHASE_UPDATE
+        with self.github.tracer.span(PHASE_UPDATE, "phase"):
+            needs_push = False
+            if self.batch is None:
+                self.generate_readme()
+                needs_push = self.commit_changes(
+                    ":books: Updated README", ["README.md"]
+                )
+
+            pending = [app for app in self.apps if app.needs_update(self.force)]
+            steps = [pending]
+            if self.deadline is not None:
+                # Update apps with releases waiting the longest first, a step
+                # at a time, until there is no time left for another step
+                pending.sort(key=priority)
+                steps = [
+                    pending[index : index + self.concurrency]
+                    for index in range(0, len(pending), self.concurrency)
+                ]
+
+            updated = []
+            self.deferred = []
+            for step in steps:
+                if self.deadline is not None and not self.deadline.allows():
+                    self.deferred = pending[len(updated) :]
+                    break
+                started = time.monotonic()
+                needs_push = self.update_pending(step) or needs_push
+                updated.extend(step)
+                if self.deadline is not None:
+                    self.deadline.record(time.monotonic() - started)
+
+            if self.deferred:
+                click.echo(crayons.yellow("-" * 50, bold=True))
+                click.echo(
+                    crayons.yellow(
+                        "Deadline near, deferring %d app updates to the next run: %s"
+                        % (
+                            len(self.deferred),
+                            ", ".join(app.repository_target for app in self.deferred),
+                        )
+                    )
+                )
 
-        for app in self.apps:
-            if app.needs_update(self.force):
+            if self.batch is not None:
+                needs_push = self.commit_batch(updated) or needs_push
+
+        if needs_push:
+            self.push()
+
+        if self.state is not None:
+            self.save_state()
+
+    def update_pending(self, pending: List[App]) -> bool:
+        """Update the given apps and commit them, returning whether to push."""
+        needs_push = False
+        if self.concurrency > 1 and len(pending) > 1:
+            # Prepare updates concurrently, but commit them one by one, in order
+            with GroupedOutput() as output, ThreadPoolExecutor(
+                max_workers=self.concurrency
+            ) as executor:
+                for app, staged in zip(
+                    pending,
+                    output.run_all(
+                        executor, self.prepare_app, [(app,) for app in pending]
+                    ),
+                ):
+                    app.publish(staged)
+                    needs_push = self.commit_app(app) or needs_push
+        else:
+            for app in pending:
                 click.echo(crayons.green("-" * 50, bold=True))
                 click.echo(crayons.green(f"Updating app {app.repository_target}"))
                 needs_push = self.update_app(app) or needs_push
+        return needs_push
+
+    def push(self):
+        """
+        Push all commits onto the remote app repository.
+
+        When the push is rejected because someone else pushed in the
+        meantime, the commits are rebased onto theirs and the push is
+        retried, after a randomized, exponentially increasing delay.
+        """
+        self.github.report.phase = PHASE_PUSH
+        click.echo(crayons.green("-" * 50, bold=True))
+        with self.github.tracer.span(PHASE_PUSH, "phase"):
+            attempt = 1
+            while True:
+                click.echo("Pushing updates onto Git apps repository...", nl=False)
+                try:
+                    self.push_commits()
+                    break
+                except PushRejected:
+                    if attempt >= self.push_attempts or (
+                        self.deadline is not None and self.deadline.remaining() <= 0
+                    ):
+                        click.echo(crayons.red("Rejected!"))
+                        raise
+                delay = random.uniform(
+                    0, min(PUSH_BACKOFF_MAX, PUSH_BACKOFF_BASE * 2 ** (attempt - 1))
+                )
+                click.echo(crayons.yellow("Rejected, retrying in %.1fs" % delay))
+                time.sleep(delay)
+                self.rebase()
+                attempt += 1
+        click.echo(crayons.green("Done"))
 
-        if needs_push:
-            click.echo(crayons.green("-" * 50, bold=True))
-            click.echo("Pushing updates onto Git apps repository...", nl=False)
+    def push_commits(self):
+        """Push all commits once, raising `PushRejected` when not fast-forward."""
+        if self.publisher is not None:
+            self.publisher.push()
+            return
+        try:
             self.git_repo.git.push()
-            click.echo(crayons.green("Done"))
+        except GitCommandError as err:
+            if is_rejected(err):
+                raise PushRejected(str(err)) from err
+            raise
+
+    def rebase(self):
+        """
+        Rebase all commits onto the remote app repository.
+
+        Apps changed upstream are loaded again from local information,
+        and the README is rendered again to include both their changes
+        and ours.
+        """
+        click.echo("Rebasing onto app repository...", nl=False)
+        with self.github.tracer.span("rebase", "git"):
+            try:
+                if self.publisher is not None:
+                    changed = self.publisher.rebase()
+                else:
+                    changed = self.rebase_commits()
+            except RebaseConflict:
+                click.echo(crayons.red("Conflict!"))
+                raise
+        click.echo(crayons.green("Done"))
+        self.reload_changed(changed)
+        self.generate_readme()
+        self.commit_paths(["README.md"], ":books: Updated README")
+
+    def rebase_commits(self) -> set[str]:
+        """
+        Fetch and rebase the local clone onto its upstream branch.
+
+        Conflicts in the README are resolved using the upstream version,
+        as it is rendered again after rebasing. Returns the paths that
+        were changed upstream.
+        """
+        git = self.git_repo.git
+        previous = git.rev_parse("@{upstream}")
+        git.fetch("origin")
+        changed = set(
+            git.diff("--name-only", "-z", previous, "@{upstream}").split("\0")
+        )
+        changed.discard("")
+        try:
+            git.rebase("@{upstream}")
+        except GitCommandError:
+            while True:
+                conflicts = set(
+                    git.diff("--name-only", "-z", "--diff-filter=U").split("\0")
+                )
+                conflicts.discard("")
+                if not conflicts or conflicts - {"README.md"}:
+                    git.rebase("--abort")
+                    raise RebaseConflict(
+                        "Changed upstream: %s" % ", ".join(sorted(conflicts))
+                    ) from None
+                git.checkout("--ours", "--", "README.md")
+                git.add("README.md")
+                try:
+                    if self.git_repo.is_dirty(index=True, working_tree=False):
+                        self.git_repo.git(c="core.editor=true").rebase("--continue")
+                    else:
+                        git.rebase("--skip")
+                    break
+                except GitCommandError:
+                    continue
+        return changed
+
+    def reload_changed(self, paths: set[str]):
+        """Load apps that were changed upstream again, from local information."""
+        if paths.intersection(REPOSITORY_CONFIG_FILES):
+            for config_file in REPOSITORY_CONFIG_FILES:
+                path = os.path.join(self.working_dir, config_file)
+                if os.path.isfile(path):
+                    with open(path, encoding="utf8") as f:
+                        config = yaml.safe_load(f)
+                    self.apps_config = config.get("apps", config.get("addons", {}))
+                    break
+
+        targets = {path.split("/", 1)[0] for path in paths}
+        loaded = {app.repository_target: app for app in self.apps}
+        apps = []
+        for target, app_config in self.apps_config.items():
+            if self.shard is not None and not in_shard(target, *self.shard):
+                continue
+            app = loaded.get(target)
+            if app is None or (target in targets and not app.written):
+                app = self.load_local_app(target, app_config)
+            apps.append(app)
+        self.apps = apps
+
+    def refresh(self) -> bool:
+        """
+        Bring the local clone of the apps repository up to date.
+
+        Local changes that were not pushed are discarded. Returns whether
+        the repository was changed by someone else in the meantime.
+        """
+        click.echo("Refreshing app repository...", nl=False)
+        if self.publisher is not None:
+            changed = self.publisher.checkout()
+        else:
+            head = self.git_repo.head.commit.hexsha
+            self.git_repo.git.fetch("--prune", "origin")
+            self.git_repo.git.reset("--hard", "@{upstream}")
+            self.git_repo.git.clean("-fdx")
+            changed = self.git_repo.head.commit.hexsha != head
+        click.echo(crayons.green("Changed" if changed else "Done"))
+        return changed
+
+    def reload_apps(self, app: str, reload_config: bool = False):
+        """
+        Reload the apps matching an app target or source repository.
+
+        When the repository changed upstream, the configuration and all
+        other apps are loaded again as well, with only the given app
+        marked for updating.
+        """
+        self.github.indexes.clear()
+        if reload_config:
+            self.apps = []
+            self.load_repository(app)
+            return
+
+        for index, loaded in enumerate(self.apps):
+            app_config = self.apps_config[loaded.repository_target]
+            if app in (app_config["repository"], loaded.repository_target):
+                self.apps[index] = self.load_app(
+                    loaded.repository_target, app_config, app
+                )
+
+    def has_app(self, app: str) -> bool:
+        """Determine whether an app target or source repository is known."""
+        return any(
+            self.is_updating(app, target, app_config)
+            for target, app_config in self.apps_config.items()
+        )
+
+    def save_state(self):
+        """Save the state of all apps, so unchanged apps are skipped next run."""
+        click.echo("Saving app state...", nl=False)
+        with self.github.tracer.span("save state"):
+            self.state.prune([app.repository_target for app in self.apps])
+            for app in self.apps:
+                state = app.get_state()
+                if state is not None:
+                    state["source"] = self.apps_config[app.repository_target][
+                        "repository"
+                    ]
+                self.state.record(app.repository_target, state)
+            self.state.save()
+        click.echo(crayons.green("Done"))
+
+    def commit_changes(self, message: str, paths: List[str]) -> bool:
+        """
+        Commit current Repository changes.
+
+        The paths are only used when publishing through the API, which
+        cannot tell what changed without being told where to look.
+        """
+        if self.publisher is not None:
+            return self.commit_paths(paths, message)
 
-    def commit_changes(self, message):
-        """Commit current Repository changes."""
         click.echo("Committing changes...", nl=False)
 
         if not self.git_repo.is_dirty(untracked_files=True):
             click.echo(crayons.yellow("Skipped, no changes."))
             return False
 
-        self.git_repo.git.add(".")
-        self.git_repo.git.commit("--no-gpg-sign", "-m", message)
+        with self.github.tracer.span("commit", "git", message=message):
+            self.git_repo.git.add(".")
+            self.git_repo.git.commit("--no-gpg-sign", "-m", message)
         click.echo(crayons.green("Done: ") + crayons.cyan(message))
         return True
 
     def update_app(self, app):
         """Update repository for a specific app."""
-        app.update()
+        with self.github.report.app(app.repository_target), self.github.tracer.span(
+            f"update {app.repository_target}", "app"
+        ):
+            app.update()
+        return self.commit_app(app)
+
+    def prepare_app(self, app: App) -> App:
+        """Prepare the update of an app, without changing the repository."""
+        click.echo(crayons.green("-" * 50, bold=True))
+        click.echo(crayons.green(f"Preparing update of app {app.repository_target}"))
+        with self.github.report.app(app.repository_target), self.github.tracer.span(
+            f"prepare {app.repository_target}", "app"
+        ):
+            return app.prepare()
+
+    def commit_app(self, app: App) -> bool:
+        """Commit the updated files of an app, along with the README."""
+        if self.batch == BATCH_COMBINED:
+            # Committed at once, after all apps are updated
+            return False
+        if self.batch is not None:
+            return self.commit_paths(self.app_paths(app), self.commit_message(app))
+
         self.generate_readme()
+        return self.commit_changes(
+            self.commit_message(app), self.app_paths(app) + ["README.md"]
+        )
 
+    def commit_batch(self, apps: List[App]) -> bool:
+        """Render the README once and commit it, with all apps when combined."""
+        self.generate_readme()
+        if self.batch != BATCH_COMBINED or not apps:
+            return self.commit_paths(["README.md"], ":books: Updated README")
+
+        paths = ["README.md"]
+        for app in apps:
+            paths.extend(self.app_paths(app))
+        return self.commit_paths(
+            paths, self.batch_message([self.commit_message(app) for app in apps])
+        )
+
+    @staticmethod
+    def batch_message(messages: List[str]) -> str:
+        """Return the message of a single commit of multiple app updates."""
+        if len(messages) == 1:
+            return messages[0]
+        return ":arrow_up: Updating %d apps\n\n%s" % (
+            len(messages),
+            "\n".join("- %s" % message for message in messages),
+        )
+
+    def commit_message(self, app: App) -> str:
+        """Return the commit message for an updated app."""
         if app.latest_is_release:
             message = ":tada: Release of app %s %s" % (
                 app.name,
@@ -95,14 +497,63 @@ class Repository:
             )
         if self.force:
             message += " (forced update)"
+        return message
+
+    @staticmethod
+    def app_paths(app: App) -> List[str]:
+        """Return the paths in the repository written by an app update."""
+        return sorted(
+            posixpath.join(app.repository_target, path) for path in app.written
+        )
+
+    def commit_paths(self, paths: List[str], message: str) -> bool:
+        """
+        Commit only the given paths, straight from the index.
 
-        return self.commit_changes(message)
+        Unlike `commit_changes`, the rest of the working tree is never
+        scanned, neither for staging nor for committing.
+        """
+        click.echo("Committing changes...", nl=False)
+        with self.github.tracer.span("commit", "git", message=message):
+            if self.publisher is not None:
+                if not self.publisher.commit(paths, message):
+                    click.echo(crayons.yellow("Skipped, no changes."))
+                    return False
+                click.echo(
+                    crayons.green("Done: ") + crayons.cyan(message.splitlines()[0])
+                )
+                return True
+
+            existing = [
+                path
+                for path in paths
+                if os.path.lexists(os.path.join(self.working_dir, path))
+            ]
+            removed = [path for path in paths if path not in existing]
+            if existing:
+                self.git_repo.git.add("--all", "--", *existing)
+            if removed:
+                self.git_repo.git.rm(
+                    "-r", "-q", "--cached", "--ignore-unmatch", "--", *removed
+                )
+
+            tree = self.git_repo.git.write_tree()
+            if tree == self.git_repo.head.commit.tree.hexsha:
+                click.echo(crayons.yellow("Skipped, no changes."))
+                return False
+
+            commit = self.git_repo.git.commit_tree(
+                tree, "-p", "HEAD", "--no-gpg-sign", "-m", message
+            )
+            self.git_repo.git.update_ref("HEAD", commit)
+        click.echo(crayons.green("Done: ") + crayons.cyan(message.splitlines()[0]))
+        return True
 
     def load_repository(self, app: str):
         """Load repository configuration from remote repository and apps."""
         click.echo("Locating repository app list...", nl=False)
         config = None
-        for config_file in (".apps.yml", ".addons.yml", ".hassio-addons.yml"):
+        for config_file in REPOSITORY_CONFIG_FILES:
             try:
                 config = self.github_repository.get_contents(config_file)
                 break
@@ -137,31 +588,150 @@ class Repository:
             click.echo(crayons.yellow('Only updating app "%s" this run!' % app))
 
         click.echo("Start loading repository apps:")
-        apps_config = config.get("apps", config.get("addons", {}))
-        for target, app_config in apps_config.items():
-            click.echo(crayons.cyan("-" * 50, bold=True))
-            click.echo(crayons.cyan(f"Loading app {target}"))
-            self.apps.append(
-                App(
-                    self.github,
-                    self.git_repo,
-                    target,
-                    app_config["image"],
-                    self.github.get_repo(app_config["repository"]),
-                    app_config["target"],
-                    self.channel,
-                    (
-                        not app
-                        or app_config["repository"] == app
-                        or target == app
-                    ),
-                )
-            )
+        self.apps_config = config.get("apps", config.get("addons", {}))
+        updating = {
+            target: app_config
+            for target, app_config in self.apps_config.items()
+            if self.is_updating(app, target, app_config)
+            and (self.shard is None or in_shard(target, *self.shard))
+        }
+        resolved = self.resolve_apps(updating) if self.graphql and updating else {}
+        items = [
+            (target, app_config, app, resolved.get(target))
+            for target, app_config in self.apps_config.items()
+            if self.shard is None or in_shard(target, *self.shard)
+        ]
+        if self.concurrency > 1:
+            with GroupedOutput() as output, ThreadPoolExecutor(
+                max_workers=self.concurrency
+            ) as executor:
+                self.apps.extend(output.run_all(executor, self.load_app, items))
+        else:
+            self.apps.extend(self.load_app(*item) for item in items)
         click.echo(crayons.cyan("-" * 50, bold=True))
         click.echo("Done loading all repository apps")
 
+    def resolve_apps(self, apps_config: dict) -> dict[str, ResolvedApp]:
+        """Resolve versions of all apps upfront, using batched GraphQL queries."""
+        click.echo("Resolving app versions using GraphQL...", nl=False)
+        apps = {}
+        for target, app_config in apps_config.items():
+            config_file, config = read_config(os.path.join(self.working_dir, target))
+            apps[target] = {
+                "repository": app_config["repository"],
+                "target": app_config["target"],
+                "version": config["version"] if config else None,
+                "config_file": config_file,
+            }
+        with self.github.tracer.span("resolve apps", "http"):
+            resolved = GraphQLResolver(self.github, self.channel).resolve(apps)
+        click.echo(crayons.green("Done"))
+        return resolved
+
+    @staticmethod
+    def is_updating(app: str | None, target: str, app_config: dict) -> bool:
+        """Determine whether an app is updated, when only updating the given app."""
+        return not app or app in (app_config["repository"], target)
+
+    def load_app(
+        self,
+        target: str,
+        app_config: dict,
+        app: str,
+        resolved: ResolvedApp | None = None,
+    ) -> App:
+        """Load a single app from the repository configuration."""
+        click.echo(crayons.cyan("-" * 50, bold=True))
+        click.echo(crayons.cyan(f"Loading app {target}"))
+        updating = not self.lazy and self.is_updating(app, target, app_config)
+        with self.github.report.app(target), self.github.tracer.span(
+            f"load {target}", "app"
+        ):
+            state = self.state.get(target) if self.state else None
+            if not updating:
+                # Only needed for the README, which local information covers
+                click.echo("Using local information, not updating this app")
+                return self.load_local_app(target, app_config)
+
+            if resolved:
+                app_repository = resolved.app_repository
+            elif state and state["source"] == app_config["repository"]:
+                app_repository = self.github.source_repository(**state["repository"])
+            else:
+                app_repository = self.github.source_repository(app_config["repository"])
+
+            return App(
+                self.github,
+                self.publisher or self.git_repo,
+                target,
+                app_config["image"],
+                app_repository,
+                app_config["target"],
+                self.channel,
+                updating,
+                resolved,
+                self.app_source,
+                self.state,
+                self.changelog_limit,
+            )
+
+    def load_local_app(self, target: str, app_config: dict) -> LazyApp:
+        """Load an app that is not updated, from local information only."""
+        state = self.state.get(target) if self.state else None
+        return LazyApp(
+            self.github,
+            self.publisher or self.git_repo,
+            target,
+            app_config["image"],
+            (
+                self.github.make_repository(**state["repository"])
+                if state and state["source"] == app_config["repository"]
+                else self.github.make_repository(app_config["repository"])
+            ),
+            app_config["target"],
+            self.channel,
+            False,
+            None,
+            self.app_source,
+            self.state,
+            self.changelog_limit,
+        )
+
+    @property
+    def head(self) -> str:
+        """Return the commit the local app repository is at."""
+        if self.publisher is not None:
+            return self.publisher.head
+        return self.git_repo.head.commit.hexsha
+
+    @property
+    def working_dir(self) -> str:
+        """Return the local working directory of the app repository."""
+        if self.publisher is not None:
+            return self.publisher.working_dir
+        return self.git_repo.working_dir
+
     def clone_repository(self):
         """Clone the app repository to a local working directory."""
+        if self.publish == PUBLISH_API:
+            click.echo("Reading app repository tree...", nl=False)
+            publisher = ApiPublisher(
+                self.github,
+                self.github_repository,
+                tempfile.mkdtemp(prefix="repoupdater"),
+                self.max_changes,
+            )
+            try:
+                publisher.checkout()
+            except TreeUnavailable:
+                click.echo(crayons.yellow("Too large, falling back to git."))
+                shutil.rmtree(publisher.working_dir, True)
+            else:
+                self.publisher = publisher
+                self.git_repo = None
+                click.echo(crayons.green("Done!"))
+                return
+
         click.echo("Cloning app repository...", nl=False)
         self.git_repo = self.github.clone(
             self.github_repository, tempfile.mkdtemp(prefix="repoupdater")
@@ -172,44 +742,48 @@ class Repository:
         """Re-generate the repository readme based on a template."""
         click.echo("Re-generating app repository README.md file...", nl=False)
 
-        if not os.path.exists(os.path.join(self.git_repo.working_dir, ".README.j2")):
+        template_file = os.path.join(self.working_dir, ".README.j2")
+        if not os.path.exists(template_file):
             click.echo(crayons.blue("skipping"))
             return
 
-        app_data = []
-        for app in self.apps:
-            data = app.get_template_data()
-            if data:
-                app_data.append(app.get_template_data())
-
-        app_data = sorted(app_data, key=lambda x: x["name"])
-
-        jinja = Environment(
-            loader=FileSystemLoader(self.git_repo.working_dir),
-            trim_blocks=True,
-            extensions=["jinja2.ext.loopcontrols"],
-        )
-
-        with open(
-            os.path.join(self.git_repo.working_dir, "README.md"), "w", encoding="utf8"
-        ) as outfile:
-            outfile.write(
-                jinja.get_template(".README.j2").render(
-                    apps=app_data,
-                    addons=app_data,  # Backward compatibility
-                    channel=self.channel,
-                    description=self.github_repository.description,
-                    homepage=self.github_repository.homepage,
-                    issues=self.github_repository.issues_url,
-                    name=self.github_repository.full_name,
-                    repo=self.github_repository.html_url,
-                )
+        with self.github.tracer.span("generate README", "render"):
+            app_data = []
+            for app in self.apps:
+                data = app.get_template_data()
+                if data:
+                    app_data.append(data)
+
+            app_data = sorted(app_data, key=lambda x: x["name"])
+
+            with open(template_file, encoding="utf8") as f:
+                template = f.read()
+
+            written = self.github.templates.render_file(
+                posixpath.join(self.github_repository.full_name, "README.md"),
+                template,
+                {
+                    "apps": app_data,
+                    "addons": app_data,  # Backward compatibility
+                    "channel": self.channel,
+                    "description": self.github_repository.description,
+                    "homepage": self.github_repository.homepage,
+                    "issues": self.github_repository.issues_url,
+                    "name": self.github_repository.full_name,
+                    "repo": self.github_repository.html_url,
+                },
+                os.path.join(self.working_dir, "README.md"),
+                self.working_dir,
             )
 
+        if not written:
+            click.echo(crayons.blue("Unchanged"))
+            return
         click.echo(crayons.green("Done"))
 
     def cleanup(self):
         """Cleanup after you leave."""
         click.echo("Cleanup...", nl=False)
-        shutil.rmtree(self.git_repo.working_dir, True)
+        self.github.templates.save()
+        shutil.rmtree(self.working_dir, True)
         click.echo(crayons.green("Done"))
@@ -0,0 +1,300 @@
+"""
+Resolver module.
+
+Resolves the version information of all apps using a few batched
+GraphQL queries, instead of multiple REST API calls per app.
+"""
+
+from __future__ import annotations
+
+import posixpath
+from datetime import datetime
+from email.utils import format_datetime
+
+import semver
+from github.Commit import Commit
+from github.GitRelease import GitRelease
+from github.Repository import Repository
+
+from .const import CHANNEL_EDGE, CONFIG_FILES
+from .github import GitHub
+from .index import find_latest_release
+
+CHUNK_SIZE = 25
+RELEASES_LIMIT = 20
+RELEASES_PAGE_SIZE = 100
+
+COMMIT_FRAGMENT = """
+fragment commit on GitObject {
+  oid
+  ... on Commit { committedDate }
+  ... on Tag { target { oid ... on Commit { committedDate } } }
+}
+"""
+
+RELEASES_FIELDS = """
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        databaseId
+        tagName
+        name
+        description
+        isDraft
+        isPrerelease
+        createdAt
+        url
+        tagCommit { ...commit }
+      }"""
+
+
+class ResolvedApp:
+    """Version information of a single app, resolved using GraphQL."""
+
+    app_repository: Repository
+    current_commit: Commit | None
+    latest_release: GitRelease | None
+    latest_version: str | None
+    latest_commit: Commit | None
+    latest_is_release: bool
+    config_file: str | None
+    config_content: str | None
+
+    def __init__(self, app_repository: Repository):
+        """Initialize a new, still empty, resolved app."""
+        self.app_repository = app_repository
+        self.current_commit = None
+        self.latest_release = None
+        self.latest_version = None
+        self.latest_commit = None
+        self.latest_is_release = True
+        self.config_file = None
+        self.config_content = None
+
+
+class GraphQLResolver:
+    """Batch resolver for versions, tags and configs of all apps."""
+
+    github: GitHub
+    channel: str
+
+    def __init__(self, github: GitHub, channel: str):
+        """Initialize a new GraphQL resolver."""
+        self.github = github
+        self.channel = channel
+
+    def resolve(self, apps: dict) -> dict[str, ResolvedApp]:
+        """
+        Resolve the given apps.
+
+        Apps are given as a mapping of the app target in the apps
+        repository to a dictionary holding the source `repository`,
+        the `target` within that source, the current `version` and the
+        existing `config_file` name (both may be None).
+        """
+        resolved = {}
+        targets = list(apps)
+        for start in range(0, len(targets), CHUNK_SIZE):
+            chunk = {
+                target: apps[target] for target in targets[start : start + CHUNK_SIZE]
+            }
+            resolved.update(self.resolve_versions(chunk))
+            self.resolve_configs(chunk, resolved)
+        return resolved
+
+    def query(self, fields: list[str], variables: dict, fragments: str = "") -> dict:
+        """Run a single GraphQL query built from aliased fields."""
+        definitions = ", ".join(f"${name}: String!" for name in variables)
+        query = "query(%s) {\n%s\n}\n%s" % (
+            definitions,
+            "\n".join(fields),
+            fragments,
+        )
+        _, data = self.github.requester.graphql_query(query, variables)
+        return data["data"]
+
+    def resolve_versions(self, apps: dict) -> dict[str, ResolvedApp]:
+        """Resolve current and latest versions for a chunk of apps."""
+        fields = []
+        variables = {}
+        for index, app in enumerate(apps.values()):
+            owner, name = app["repository"].split("/", 1)
+            variables[f"owner{index}"] = owner
+            variables[f"name{index}"] = name
+            current = ""
+            if app["version"] is not None:
+                version = str(app["version"])
+                variables[f"tag{index}"] = f"refs/tags/{version}"
+                variables[f"vtag{index}"] = f"refs/tags/v{version}"
+                variables[f"rev{index}"] = version
+                variables[f"vrev{index}"] = f"v{version}"
+                current = f"""
+    tag: ref(qualifiedName: $tag{index}) {{ target {{ ...commit }} }}
+    vtag: ref(qualifiedName: $vtag{index}) {{ target {{ ...commit }} }}
+    rev: object(expression: $rev{index}) {{ ...commit }}
+    vrev: object(expression: $vrev{index}) {{ ...commit }}"""
+            fields.append(f"""
+  app{index}: repository(owner: $owner{index}, name: $name{index}) {{
+    nameWithOwner
+    url
+    defaultBranchRef {{ name target {{ ...commit }} }}{current}
+    releases(first: {RELEASES_LIMIT},
+             orderBy: {{field: CREATED_AT, direction: DESC}}) {{{RELEASES_FIELDS}
+    }}
+  }}""")
+
+        data = self.query(fields, variables, COMMIT_FRAGMENT)
+        return {
+            target: self.resolve_app(app, data[f"app{index}"])
+            for index, (target, app) in enumerate(apps.items())
+        }
+
+    def resolve_app(self, app: dict, data: dict) -> ResolvedApp:
+        """Turn the GraphQL data of a single app into a resolved app."""
+        repository = self.make_repository(data)
+        resolved = ResolvedApp(repository)
+
+        if app["version"] is not None:
+            try:
+                semver.parse(str(app["version"]))
+                candidates = ("tag", "vtag")
+            except ValueError:
+                candidates = ("vrev", "rev")
+            for candidate in candidates:
+                if data.get(candidate):
+                    target = data[candidate]
+                    if "target" in target and candidate in ("tag", "vtag"):
+                        target = target["target"]
+                    resolved.current_commit = self.make_commit(repository, target)
+                    break
+
+        releases = {}
+        page = data["releases"]
+        while True:
+            for node in page["nodes"]:
+                release = self.make_release(repository, node)
+                releases.setdefault(release.tag_name, (release, node))
+            # Releases whose tag was deleted cannot be used
+            latest_release = find_latest_release(
+                [release for release, _ in releases.values()],
+                self.channel,
+                lambda release: releases[release.tag_name][1]["tagCommit"] is not None,
+            )
+            # Only the newest releases are queried for all apps at once; page
+            # through the rest when none of those were published on the channel
+            if latest_release or not page.get("pageInfo", {}).get("hasNextPage"):
+                break
+            page = self.query_releases(
+                data["nameWithOwner"], page["pageInfo"]["endCursor"]
+            )
+        if latest_release:
+            resolved.latest_release = latest_release
+            resolved.latest_version = latest_release.tag_name.lstrip("v")
+            resolved.latest_commit = self.make_commit(
+                repository, releases[latest_release.tag_name][1]["tagCommit"]
+            )
+
+        head = data["defaultBranchRef"]["target"]
+        if self.channel == CHANNEL_EDGE and (
+            not resolved.latest_commit or resolved.latest_commit.sha != head["oid"]
+        ):
+            resolved.latest_commit = self.make_commit(repository, head)
+            resolved.latest_version = head["oid"][:7]
+            resolved.latest_is_release = False
+
+        return resolved
+
+    def query_releases(self, full_name: str, cursor: str) -> dict:
+        """Query the next page of releases of a single repository."""
+        owner, name = full_name.split("/", 1)
+        data = self.query(
+            [f"""
+  app: repository(owner: $owner, name: $name) {{
+    releases(first: {RELEASES_PAGE_SIZE}, after: $cursor,
+             orderBy: {{field: CREATED_AT, direction: DESC}}) {{{RELEASES_FIELDS}
+    }}
+  }}"""],
+            {"owner": owner, "name": name, "cursor": cursor},
+            COMMIT_FRAGMENT,
+        )
+        return data["app"]["releases"]
+
+    def resolve_configs(self, apps: dict, resolved: dict[str, ResolvedApp]):
+        """Fetch the config file at the latest commit for a chunk of apps."""
+        fields = []
+        variables = {}
+        for index, (target, app) in enumerate(apps.items()):
+            if resolved[target].latest_commit is None:
+                continue
+            owner, name = app["repository"].split("/", 1)
+            variables[f"owner{index}"] = owner
+            variables[f"name{index}"] = name
+            objects = []
+            for config_index, config_file in enumerate(CONFIG_FILES):
+                variables[f"config{index}_{config_index}"] = "%s:%s" % (
+                    resolved[target].latest_commit.sha,
+                    posixpath.normpath(posixpath.join(app["target"], config_file)),
+                )
+                objects.append(
+                    f"    config{config_index}: object("
+                    f"expression: $config{index}_{config_index}) "
+                    "{ ... on Blob { text } }"
+                )
+            fields.append(
+                f"  app{index}: repository(owner: $owner{index}, name: $name{index})"
+                " {\n%s\n  }" % "\n".join(objects)
+            )
+
+        if not fields:
+            return
+
+        data = self.query(fields, variables)
+        for index, (target, app) in enumerate(apps.items()):
+            if f"app{index}" not in data:
+                continue
+            config_files = list(CONFIG_FILES)
+            # Ensure existing filename is at the start of the list
+            if app["config_file"] is not None:
+                config_files.insert(
+                    0, config_files.pop(config_files.index(app["config_file"]))
+                )
+            for config_file in config_files:
+                blob = data[f"app{index}"][f"config{CONFIG_FILES.index(config_file)}"]
+                if blob:
+                    resolved[target].config_file = config_file
+                    resolved[target].config_content = blob["text"]
+                    break
+
+    def make_repository(self, data: dict) -> Repository:
+        """Create a repository object that completes itself when needed."""
+        return self.github.make_repository(
+            data["nameWithOwner"],
+            html_url=data["url"],
+            clone_url=data["url"] + ".git",
+            default_branch=data["defaultBranchRef"]["name"],
+        )
+
+    def make_commit(self, repository: Repository, data: dict) -> Commit:
+        """Create a commit object from a (peeled) GraphQL git object."""
+        if "committedDate" not in data and "target" in data:
+            data = data["target"]
+        last_modified = None
+        if data.get("committedDate"):
+            last_modified = format_datetime(
+                datetime.fromisoformat(data["committedDate"].replace("Z", "+00:00")),
+                usegmt=True,
+            )
+        return self.github.make_commit(repository, data["oid"], last_modified)
+
+    def make_release(self, repository: Repository, data: dict) -> GitRelease:
+        """Create a release object from GraphQL release data."""
+        return self.github.make_release(
+            repository,
+            id=data["databaseId"],
+            tag_name=data["tagName"],
+            name=data["name"],
+            body=data["description"],
+            draft=data["isDraft"],
+            prerelease=data["isPrerelease"],
+            created_at=data["createdAt"],
+            html_url=data["url"],
+        )
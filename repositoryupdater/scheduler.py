@@ -0,0 +1,176 @@
+"""
+Scheduler module.
+
+Paces the GitHub API requests of all threads, based on the rate limits
+GitHub reports with every response. Concurrency is lowered when GitHub
+pushes back, and raised again while requests succeed, so runs slow down
+predictably instead of failing on rate limits.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+DEFAULT_ATTEMPTS = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# GitHub asks to wait a second in between requests that create content
+WRITE_INTERVAL = 1.0
+# Wait this long for secondary rate limits that do not say how long to wait
+SECONDARY_RATE_WAIT = 60.0
+# Give up on rate limits that take longer than this to reset
+MAX_RATE_WAIT = 15 * 60.0
+# Start spreading requests until the reset once fewer than this are left
+LOW_REMAINING = 100
+
+
+def backoff(attempt: int) -> float:
+    """Return a randomized, exponentially increasing delay for an attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def resource(url: str) -> str:
+    """Return the rate limit resource a request counts against."""
+    return "graphql" if urlparse(url).path.endswith("/graphql") else "core"
+
+
+def header_number(headers, name: str) -> float | None:
+    """Return the number in a response header, if it holds one."""
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def rate_limit_wait(response: requests.Response, stream: bool = False) -> float | None:
+    """Return how long to wait before retrying a rate limited response."""
+    if response.status_code not in (403, 429):
+        return None
+    headers = response.headers
+    if "Retry-After" in headers:
+        retry_after = header_number(headers, "Retry-After")
+        return SECONDARY_RATE_WAIT if retry_after is None else max(0.0, retry_after)
+    if header_number(headers, "X-RateLimit-Remaining") == 0:
+        reset = header_number(headers, "X-RateLimit-Reset")
+        if reset is None:
+            return SECONDARY_RATE_WAIT
+        return max(0.0, reset - time.time()) + 1
+    if response.status_code == 429 or (
+        not stream and "rate limit" in response.text.lower()
+    ):
+        return SECONDARY_RATE_WAIT
+    return None
+
+
+class RequestScheduler:
+    """Adaptive concurrency and pacing of requests, shared by all threads."""
+
+    max_concurrency: int
+    limit: int
+    attempts: int
+
+    def __init__(self, max_concurrency: int, attempts: int = DEFAULT_ATTEMPTS):
+        """Initialize a new scheduler, allowing the given concurrent requests."""
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.attempts = attempts
+        self.condition = threading.Condition()
+        self.active = 0
+        self.successes = 0
+        self.paused_until = 0.0
+        self.next_write = 0.0
+        self.intervals = {}
+        self.next_request = {}
+
+    @contextmanager
+    def slot(self, verb: str, url: str):
+        """Wait for a turn to send a request, and hold it while it is sent."""
+        kind = resource(url)
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                start = max(
+                    self.paused_until,
+                    self.next_request.get(kind, 0.0),
+                    self.next_write if verb != "GET" else 0.0,
+                )
+                if self.active < self.limit and start <= now:
+                    break
+                self.condition.wait(start - now if self.active < self.limit else None)
+            self.active += 1
+            self.next_request[kind] = now + self.intervals.get(kind, 0.0)
+            if verb != "GET":
+                self.next_write = now + WRITE_INTERVAL
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+    def update(
+        self, url: str, response: requests.Response, stream: bool = False
+    ) -> float | None:
+        """
+        Adapt to the rate limit reported by a response.
+
+        Returns how long to wait before retrying the request, when it was
+        rate limited. Other requests are only held back for that long once
+        the request is actually retried, see `pause`.
+        """
+        wait = rate_limit_wait(response, stream)
+        with self.condition:
+            remaining = header_number(response.headers, "X-RateLimit-Remaining")
+            reset = header_number(response.headers, "X-RateLimit-Reset")
+            if remaining is not None and reset is not None:
+                until_reset = max(0.0, reset - time.time())
+                # Spread what is left over the time until the reset
+                self.intervals[resource(url)] = (
+                    until_reset / remaining if 0 < remaining < LOW_REMAINING else 0.0
+                )
+
+            if wait is not None:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            elif response.status_code < 500:
+                self.successes += 1
+                if self.limit < self.max_concurrency and self.successes >= self.limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+        return wait
+
+    def pause(self, wait: float):
+        """Hold back all requests for the given number of seconds."""
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + wait)
+            self.condition.notify_all()
+
+    def retry_delay(
+        self, verb: str, attempt: int, wait: float | None, status: int | None
+    ) -> float | None:
+        """
+        Return how long to wait before retrying a failed attempt, if at all.
+
+        Rate limited requests were not handled by GitHub, so they are
+        retried regardless of their method. Server errors and timeouts
+        are only retried for requests that are safe to repeat.
+        """
+        if attempt >= self.attempts:
+            return None
+        if wait is not None:
+            # Spread the retries of requests that were all held back at once
+            return (
+                wait + random.uniform(0, BACKOFF_BASE)
+                if wait <= MAX_RATE_WAIT
+                else None
+            )
+        if verb == "GET" and (status is None or status >= 500):
+            return backoff(attempt)
+        return None
@@ -0,0 +1,227 @@
+"""
+Session module.
+
+Provides a single pooled HTTP session that is shared by every request
+the GitHub client makes, so it can be used from multiple threads at once.
+Requests are paced by a shared scheduler, and retried when rate limited
+or, when safe to repeat, when they fail or time out.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import requests
+from github.Requester import Requester, RequestsResponse
+from requests.adapters import HTTPAdapter
+
+from .cache import ResponseCache
+from .report import RunReport, endpoint
+from .scheduler import RequestScheduler
+from .trace import NO_SPAN, Tracer
+
+DEFAULT_POOL_SIZE = 10
+
+
+class Session:
+    """Shared, pooled HTTP session used for all GitHub API requests."""
+
+    http: requests.Session
+    cache: ResponseCache | None
+    report: RunReport | None
+    tracer: Tracer
+    scheduler: RequestScheduler
+
+    def __init__(
+        self,
+        pool_size: int | None = None,
+        cache: ResponseCache | None = None,
+        report: RunReport | None = None,
+        tracer: Tracer | None = None,
+    ):
+        """Initialize a new shared HTTP session."""
+        self.cache = cache
+        self.report = report
+        self.tracer = tracer or Tracer()
+        pool_size = pool_size or DEFAULT_POOL_SIZE
+        self.scheduler = RequestScheduler(pool_size)
+        # Retries are up to the scheduler, which knows about rate limits
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
+        self.http = requests.Session()
+        # Prevents requests from falling back to credentials in .netrc
+        self.http.auth = Requester.noopAuth
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+    def request(
+        self,
+        verb: str,
+        url: str,
+        headers: dict,
+        data=None,
+        timeout: float | None = None,
+        verify: bool | str = True,
+        stream: bool = False,
+    ) -> requests.Response:
+        """Send a request using the pooled connections, retrying when needed."""
+        key = entry = None
+        if self.cache is not None and verb == "GET" and not stream:
+            key = self.cache.key(url, headers)
+            entry = self.cache.get(key)
+            if entry is not None:
+                headers = {**headers, **self.cache.conditional_headers(entry)}
+
+        attempt = 1
+        while True:
+            try:
+                response = self.send(
+                    verb, url, headers, data, timeout, verify, stream, attempt
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self.scheduler.retry_delay(verb, attempt, None, None)
+                if delay is None:
+                    raise
+            else:
+                wait = self.scheduler.update(url, response, stream)
+                delay = None
+                if wait is not None or response.status_code >= 500:
+                    delay = self.scheduler.retry_delay(
+                        verb, attempt, wait, response.status_code
+                    )
+                if delay is None:
+                    break
+                if wait is not None:
+                    # The rate limit applies to the requests of all threads
+                    self.scheduler.pause(wait)
+                response.close()
+            with self.tracer.span("retry", "http", url=url, delay=delay):
+                time.sleep(delay)
+            attempt += 1
+
+        if key is not None:
+            if response.status_code == 304 and entry is not None:
+                return self.cache.response(entry, response)
+            if response.status_code == 200:
+                self.cache.store(key, response)
+
+        return response
+
+    def send(
+        self,
+        verb: str,
+        url: str,
+        headers: dict,
+        data,
+        timeout: float | None,
+        verify: bool | str,
+        stream: bool,
+        attempt: int,
+    ) -> requests.Response:
+        """Send a single attempt of a request, once the scheduler allows."""
+        start = time.monotonic()
+        # Only name the span when tracing, this runs for every request
+        trace = (
+            self.tracer.span(f"{verb} {endpoint(url)}", "http", url=url)
+            if self.tracer.enabled
+            else NO_SPAN
+        )
+        with self.scheduler.slot(verb, url), trace as span:
+            response = self.http.request(
+                verb,
+                url,
+                headers=headers,
+                data=data,
+                timeout=timeout,
+                verify=verify,
+                stream=stream,
+                allow_redirects=False,
+            )
+            if span is not None:
+                span["status"] = response.status_code
+        if self.report is not None:
+            self.report.record(
+                verb,
+                url,
+                response.status_code,
+                (
+                    int(response.headers.get("Content-Length", 0))
+                    if stream
+                    else len(response.content)
+                ),
+                time.monotonic() - start,
+                not_modified=response.status_code == 304,
+                retry=attempt > 1,
+            )
+        return response
+
+    def connection_classes(self):
+        """Return HTTP and HTTPS connection classes bound to this session."""
+        return (
+            type(
+                "HTTPConnection", (Connection,), {"protocol": "http", "session": self}
+            ),
+            type(
+                "HTTPSConnection", (Connection,), {"protocol": "https", "session": self}
+            ),
+        )
+
+    def close(self):
+        """Close all pooled connections."""
+        self.http.close()
+
+
+class Connection:
+    """
+    Connection class handed to PyGitHub that uses the shared session.
+
+    PyGitHub calls `request` and `getresponse` in turn on a connection
+    object that may be shared between threads, so the pending request
+    is stored thread local.
+    """
+
+    protocol: str
+    session: Session
+
+    def __init__(
+        self,
+        host: str,
+        port: int | None = None,
+        strict: bool = False,
+        timeout: int | None = None,
+        retry=None,
+        pool_size: int | None = None,
+        **kwargs,
+    ):
+        """Initialize a new connection to the given host."""
+        self.host = host
+        self.port = port if port else (443 if self.protocol == "https" else 80)
+        self.timeout = timeout
+        self.verify = kwargs.get("verify", True)
+        self.pending = threading.local()
+
+    def request(self, verb, url, input, headers, stream=False):
+        """Store the request to send on the next `getresponse` call."""
+        # pylint: disable=redefined-builtin
+        self.pending.request = (verb, url, input, headers, stream)
+
+    def getresponse(self) -> RequestsResponse:
+        """Send the pending request of the current thread."""
+        verb, url, data, headers, stream = self.pending.request
+        return RequestsResponse(
+            self.session.request(
+                verb,
+                f"{self.protocol}://{self.host}:{self.port}{url}",
+                headers,
+                data,
+                timeout=self.timeout,
+                verify=self.verify,
+                stream=stream,
+            )
+        )
+
+    def close(self):
+        """Leave the shared session open, as it outlives a single connection."""
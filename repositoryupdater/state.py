@@ -0,0 +1,81 @@
+"""
+State module.
+
+Keeps track of what was resolved for each app in previous runs, so apps
+whose source repository did not change can be skipped entirely.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+
+STATE_VERSION = 1
+
+
+class RunState:
+    """Persistent state of the apps, as resolved by previous runs."""
+
+    path: str | None
+    apps: dict
+
+    def __init__(self, path: str | None = None):
+        """
+        Initialize a new run state, loading the state file if it exists.
+
+        Without a path, the state is only kept in memory.
+        """
+        self.path = path
+        self.apps = {}
+        if path is None:
+            return
+        try:
+            with open(path, encoding="utf8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("version") == STATE_VERSION:
+            self.apps = state.get("apps", {})
+
+    def get(self, target: str) -> dict | None:
+        """Return the stored state of an app."""
+        return self.apps.get(target)
+
+    def record(self, target: str, state: dict | None):
+        """Record the state of an app, or forget it when there is none."""
+        if state is None:
+            self.apps.pop(target, None)
+            return
+
+        # Apps that were not updated this run did not resolve their latest
+        # version; keep what was known, as long as nothing changed.
+        previous = self.apps.get(target)
+        if (
+            state["latest"] is None
+            and previous
+            and previous["fingerprint"] == state["fingerprint"]
+            and previous["version"] == state["version"]
+        ):
+            state["latest"] = previous["latest"]
+        self.apps[target] = state
+
+    def prune(self, targets):
+        """Forget the state of apps that are no longer in the repository."""
+        self.apps = {
+            target: state for target, state in self.apps.items() if target in targets
+        }
+
+    def save(self):
+        """Write the state file."""
+        if self.path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf8", dir=directory, delete=False
+        ) as f:
+            json.dump(
+                {"version": STATE_VERSION, "apps": self.apps}, f, indent=2, default=str
+            )
+        os.replace(f.name, self.path)
@@ -0,0 +1,124 @@
+"""
+Sync module.
+
+Synchronizes files and directories from an app source into the apps
+repository, only touching what actually changed, so unchanged files
+keep their modification times and git has nothing to re-hash.
+"""
+
+from __future__ import annotations
+
+import os
+import posixpath
+import shutil
+import stat
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def same_content(source: str, destination: str) -> bool:
+    """Return whether two files have the same size, mode and content."""
+    try:
+        source_stat = os.stat(source)
+        destination_stat = os.lstat(destination)
+    except FileNotFoundError:
+        return False
+    if (
+        not stat.S_ISREG(destination_stat.st_mode)
+        or source_stat.st_size != destination_stat.st_size
+        or (source_stat.st_mode & 0o111) != (destination_stat.st_mode & 0o111)
+    ):
+        return False
+    with open(source, "rb") as src, open(destination, "rb") as dst:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if chunk != dst.read(CHUNK_SIZE):
+                return False
+            if not chunk:
+                return True
+
+
+def copy_file(source: str, destination: str):
+    """
+    Copy a file and its mode.
+
+    Uses `copy_file_range` where available, which lets the kernel copy
+    without passing data through user space, or share the data (reflink)
+    on filesystems that support it.
+    """
+    if os.path.lexists(destination) and not os.path.isfile(destination):
+        remove(destination)
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                shutil.copymode(source, destination)
+                return
+        except OSError:
+            pass
+    shutil.copyfile(source, destination)
+    shutil.copymode(source, destination)
+
+
+def remove(path: str):
+    """Remove a file or a directory tree."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def sync(source_root: str, destination_root: str, path: str) -> set[str]:
+    """
+    Make a path in the destination equal to the same path in the source.
+
+    Files are only written when their content differs, and files that no
+    longer exist in the source are removed. Returns the paths of all
+    written and removed files, relative to the roots.
+    """
+    source = os.path.join(source_root, path)
+    destination = os.path.join(destination_root, path)
+    changes = set()
+
+    if os.path.isfile(source):
+        if not same_content(source, destination):
+            copy_file(source, destination)
+            changes.add(path)
+        return changes
+
+    if not os.path.isdir(source):
+        if os.path.lexists(destination):
+            changes.update(files(destination_root, path))
+            remove(destination)
+        return changes
+
+    if os.path.lexists(destination) and not os.path.isdir(destination):
+        changes.add(path)
+        os.remove(destination)
+    os.makedirs(destination, exist_ok=True)
+
+    for entry in sorted(os.listdir(source)):
+        changes.update(sync(source_root, destination_root, posixpath.join(path, entry)))
+    for entry in sorted(os.listdir(destination)):
+        if not os.path.lexists(os.path.join(source, entry)):
+            changes.update(files(destination_root, posixpath.join(path, entry)))
+            remove(os.path.join(destination, entry))
+    return changes
+
+
+def files(root: str, path: str) -> set[str]:
+    """Return the paths of all files at or below a path, relative to the root."""
+    full = os.path.join(root, path)
+    if not os.path.isdir(full) or os.path.islink(full):
+        return {path}
+    found = set()
+    for directory, _, names in os.walk(full):
+        relative = os.path.relpath(directory, root).replace(os.sep, "/")
+        found.update(posixpath.join(relative, name) for name in names)
+    return found
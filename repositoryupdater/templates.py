@@ -0,0 +1,201 @@
+"""
+Templates module.
+
+Renders the Jinja templates of apps and the apps repository through a
+shared environment per directory they are rendered from. Templates are
+identified by the hash of their content, so compiled templates can be
+reused from memory and from an on-disk bytecode cache, and renders of
+unchanged templates with unchanged data can be skipped altogether.
+Templates they include, extend or import are loaded from the directory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+
+from jinja2 import (
+    BaseLoader,
+    ChoiceLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    TemplateNotFound,
+    meta,
+)
+
+
+def digest(content: str) -> str:
+    """Return the hash of a string."""
+    return hashlib.sha256(content.encode("utf8")).hexdigest()
+
+
+def is_template(path: str) -> bool:
+    """Determine whether a path is a template next to the README template."""
+    return "/" not in path and path.endswith(".j2")
+
+
+class ContentLoader(BaseLoader):
+    """Loads templates by the hash of their content."""
+
+    def __init__(self):
+        """Initialize a new, empty loader."""
+        self.sources = {}
+
+    def add(self, source: str) -> str:
+        """Add a template source and return the name to load it by."""
+        name = digest(source)
+        self.sources[name] = source
+        return name
+
+    def get_source(self, environment, template):
+        """Return the source of a template, which is never outdated."""
+        if template not in self.sources:
+            raise TemplateNotFound(template)
+        return self.sources[template], template, lambda: True
+
+
+class TemplateEngine:
+    """Shared Jinja environments with compiled template and render caches."""
+
+    directory: str | None
+    jinja: Environment
+
+    def __init__(self, directory: str | None = None):
+        """
+        Initialize a new template engine.
+
+        When a directory is given, compiled templates and the hashes of
+        previous renders are kept there in between runs.
+        """
+        self.directory = directory
+        self.loader = ContentLoader()
+        self.lock = threading.Lock()
+        self.renders = {}
+        self.changed = False
+        self.bytecode_cache = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.bytecode_cache = FileSystemBytecodeCache(directory)
+            try:
+                with open(self.renders_file, encoding="utf8") as f:
+                    self.renders = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self.jinja = self.create_environment(self.loader)
+        self.environments = {}
+
+    @property
+    def renders_file(self) -> str:
+        """Return the file the hashes of previous renders are kept in."""
+        return os.path.join(self.directory, "renders.json")
+
+    def create_environment(self, loader: BaseLoader) -> Environment:
+        """Create a Jinja environment sharing the bytecode cache."""
+        return Environment(
+            loader=loader,
+            trim_blocks=True,
+            extensions=["jinja2.ext.loopcontrols"],
+            bytecode_cache=self.bytecode_cache,
+        )
+
+    def environment(self, searchpath: str | None) -> Environment:
+        """Return the environment for templates rendered from a directory."""
+        if searchpath is None:
+            return self.jinja
+        if searchpath not in self.environments:
+            self.environments[searchpath] = self.create_environment(
+                ChoiceLoader([self.loader, FileSystemLoader(searchpath)])
+            )
+        return self.environments[searchpath]
+
+    def dependencies(self, source: str, searchpath: str | None) -> str | None:
+        """
+        Return the hash of the templates a template source loads.
+
+        Returns None when they cannot be determined up front, because a
+        template is loaded by a name that is only known when rendering.
+        """
+        environment = self.environment(searchpath)
+        sources = {}
+        pending = [source]
+        while pending:
+            for name in meta.find_referenced_templates(
+                environment.parse(pending.pop())
+            ):
+                if name is None:
+                    return None
+                if name in sources:
+                    continue
+                try:
+                    sources[name] = environment.loader.get_source(environment, name)[0]
+                except TemplateNotFound:
+                    # Rendering fails on it as well
+                    sources[name] = ""
+                    continue
+                pending.append(sources[name])
+        return digest(json.dumps(sources, sort_keys=True))
+
+    def render(self, source: str, data: dict, searchpath: str | None = None) -> str:
+        """
+        Render a template source with the given data.
+
+        Templates it includes, extends or imports are loaded from the
+        search path, when given.
+        """
+        with self.lock:
+            name = self.loader.add(source)
+            template = self.environment(searchpath).get_template(name)
+        return template.render(**data)
+
+    def render_file(
+        self,
+        name: str,
+        source: str,
+        data: dict,
+        path: str,
+        searchpath: str | None = None,
+    ) -> bool:
+        """
+        Render a template into a file, unless it already holds that render.
+
+        The name identifies the output across runs, e.g. its path in the
+        apps repository. Returns whether the file was written.
+        """
+        with self.lock:
+            dependencies = self.dependencies(source, searchpath)
+            previous = self.renders.get(name)
+        key = "%s:%s:%s" % (
+            digest(source),
+            dependencies,
+            digest(json.dumps(data, sort_keys=True, default=str)),
+        )
+        if (
+            dependencies is not None
+            and previous is not None
+            and previous[0] == key
+            and os.path.isfile(path)
+        ):
+            with open(path, encoding="utf8") as f:
+                if digest(f.read()) == previous[1]:
+                    return False
+
+        output = self.render(source, data, searchpath)
+        with open(path, "w", encoding="utf8") as outfile:
+            outfile.write(output)
+
+        with self.lock:
+            self.renders[name] = (key, digest(output))
+            self.changed = True
+        return True
+
+    def save(self):
+        """Keep the hashes of the renders of this run for the next run."""
+        with self.lock:
+            if not self.directory or not self.changed:
+                return
+            with open(self.renders_file, "w", encoding="utf8") as f:
+                json.dump(self.renders, f)
+            self.changed = False
@@ -0,0 +1,85 @@
+"""
+Trace module.
+
+Records nested, timed spans of everything a run does, and exports them
+in the Chrome trace event format, which can be opened in Perfetto or
+chrome://tracing.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+NO_SPAN = nullcontext()
+
+
+class Tracer:
+    """Collects timed spans; does nothing until it is started."""
+
+    enabled: bool
+    events: list
+
+    def __init__(self):
+        """Initialize a new, disabled tracer."""
+        self.enabled = False
+        self.events = []
+        self.threads = {}
+        self.origin = time.perf_counter_ns()
+
+    def start(self):
+        """Start recording spans."""
+        self.origin = time.perf_counter_ns()
+        self.enabled = True
+
+    def span(self, name: str, category: str = "run", **args):
+        """Return a context manager that records a span, when enabled."""
+        if not self.enabled:
+            return NO_SPAN
+        return self.record(name, category, args)
+
+    @contextmanager
+    def record(self, name: str, category: str, args: dict):
+        """Record a single span around the managed block."""
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter_ns()
+            thread = threading.current_thread()
+            self.threads[thread.ident] = thread.name
+            # Appending to a list is atomic, so no lock is needed here
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": (start - self.origin) / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": os.getpid(),
+                    "tid": thread.ident,
+                    "args": args,
+                }
+            )
+
+    def save(self, path: str):
+        """Write all recorded spans as Chrome trace event JSON."""
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": ident,
+                "args": {"name": name},
+            }
+            for ident, name in list(self.threads.items())
+        ]
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(
+                {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"},
+                f,
+                default=str,
+            )
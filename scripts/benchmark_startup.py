@@ -0,0 +1,98 @@
+"""
+Startup benchmark of the Repository Updater.
+
+Git starts the askpass helper for every clone, fetch and push, and the
+GitHub Action prints the version before each run, so both must start
+fast. This measures their startup time on top of a bare interpreter and
+fails when a heavy dependency is imported, or when they became slower
+than the given limits.
+
+Usage: python scripts/benchmark_startup.py [--runs N]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that are only needed for an actual update
+HEAVY_MODULES = ("github", "git", "jinja2", "requests", "emoji", "yaml", "semver")
+
+COMMANDS = {
+    "askpass": (
+        "import sys; sys.argv = ['askpass', \"Username for 'https://github.com': \"]; "
+        "from repositoryupdater.askpass import git_askpass; git_askpass()"
+    ),
+    "version": (
+        "import sys; sys.argv = ['repository-updater', '--version']; "
+        "from repositoryupdater.cli import repository_updater; repository_updater()"
+    ),
+}
+
+# Maximum startup time in milliseconds, on top of a bare interpreter
+LIMITS = {"askpass": 25, "version": 150}
+
+
+def run(code: str, runs: int) -> float:
+    """Return the median wall time of running Python code, in milliseconds."""
+    environ = {**os.environ, "GIT_USERNAME": "benchmark", "PYTHONPATH": ROOT}
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            env=environ,
+            stdout=subprocess.DEVNULL,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def imported(code: str) -> list:
+    """Return the heavy modules that are imported by running Python code."""
+    check = (
+        "import atexit, sys\n"
+        f"atexit.register(lambda: print(*(m for m in {HEAVY_MODULES!r} "
+        "if m in sys.modules), file=sys.stderr))\n" + code
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        check=True,
+        env={**os.environ, "GIT_USERNAME": "benchmark", "PYTHONPATH": ROOT},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return result.stderr.split()
+
+
+def main():
+    """Run the benchmark and exit with an error on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=15, help="runs per command")
+    args = parser.parse_args()
+
+    baseline = run("pass", args.runs)
+    print(f"{'interpreter':<12} {baseline:8.1f} ms")
+
+    failed = False
+    for name, code in COMMANDS.items():
+        overhead = run(code, args.runs) - baseline
+        modules = imported(code)
+        ok = overhead <= LIMITS[name] and not modules
+        failed = failed or not ok
+        print(
+            f"{name:<12} {overhead:+8.1f} ms (limit {LIMITS[name]} ms)"
+            + (f", imports {', '.join(modules)}" if modules else "")
+            + ("" if ok else "  FAILED")
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -44,11 +44,12 @@ setup(
         "PyGithub==2.9.1",
         "python-dateutil==2.9.0.post0",
         "PyYAML==6.0.3",
+        "requests==2.34.2",
         "semver==3.0.4",
     ],
     entry_points="""
         [console_scripts]
             repository-updater=repositoryupdater.cli:repository_updater
-            repository-updater-git-askpass=repositoryupdater.cli:git_askpass
+            repository-updater-git-askpass=repositoryupdater.askpass:git_askpass
     """,
 )
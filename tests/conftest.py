@@ -0,0 +1,135 @@
+"""Shared fixtures for the Repository Updater tests."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from git import Repo
+
+from repositoryupdater.github import GitHub
+
+
+class StubServer:
+    """Local HTTP server standing in for the GitHub API."""
+
+    def __init__(self):
+        """Start a stub server on a free port, without any routes."""
+        self.routes = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Answers requests using the routes of the stub."""
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+            def handle_request(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                stub.requests.append((self.command, self.path, body))
+                route = stub.routes.get((self.command, self.path.partition("?")[0]))
+                if route is None:
+                    status, headers, data = 404, {}, {"message": "Not Found"}
+                else:
+                    status, headers, data = route(self, body)
+                if isinstance(data, bytes):
+                    content, content_type = data, "application/octet-stream"
+                else:
+                    content, content_type = (
+                        json.dumps(data).encode(),
+                        "application/json",
+                    )
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_PATCH = handle_request
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def route(self, verb: str, path: str, responses):
+        """
+        Answer requests to a path with the given responses, in turn.
+
+        Responses are `(status, headers, data)` tuples, or callables that
+        return one. Data is sent as JSON, unless it is bytes. The last response is repeated once all are used.
+        """
+        responses = list(responses)
+
+        def respond(handler, body):
+            response = responses.pop(0) if len(responses) > 1 else responses[0]
+            return response(handler, body) if callable(response) else response
+
+        self.routes[(verb, path)] = respond
+
+    def count(self, verb: str, path: str) -> int:
+        """Return the number of requests made to a path."""
+        return sum(
+            1
+            for method, url, _ in self.requests
+            if method == verb and url.partition("?")[0] == path
+        )
+
+    def close(self):
+        """Stop the stub server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    """Return a running stub of the GitHub API."""
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def github(stub):
+    """Return a GitHub client talking to the stub server."""
+    client = GitHub("token", base_url=stub.url, timeout=2)
+    yield client
+    client.session.close()
+
+
+@pytest.fixture
+def stub_user(stub):
+    """Answer requests for the authenticated user, who commits."""
+    stub.route(
+        "GET",
+        "/user",
+        [(200, {}, {"login": "bot", "name": "Bot", "email": "bot@example.com"})],
+    )
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """Return a function creating a bare repository holding the given files."""
+
+    def create(name: str, files: dict[str, str]) -> str:
+        path = str(tmp_path / f"{name}.git")
+        seed = Repo.init(str(tmp_path / f"{name}-seed"), initial_branch="main")
+        seed.git.config("user.name", "Seed")
+        seed.git.config("user.email", "seed@example.com")
+        for file, content in files.items():
+            local = os.path.join(seed.working_dir, *file.split("/"))
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            with open(local, "w", encoding="utf8") as f:
+                f.write(content)
+        seed.git.add("--all")
+        seed.git.commit("-m", "Initial")
+        seed.clone(path, bare=True)
+        return path
+
+    return create
@@ -0,0 +1,157 @@
+"""Tests for fetching the source of an app update."""
+
+from __future__ import annotations
+
+import base64
+import io
+import os
+import shutil
+import tarfile
+from types import SimpleNamespace
+
+import pytest
+
+from repositoryupdater.app import App
+from repositoryupdater.const import SOURCE_DELTA
+from repositoryupdater.publisher import MODE_FILE, MODE_SYMLINK, blob_sha
+
+COMMIT = "f" * 40
+
+
+def blob(content: bytes, mode: str = MODE_FILE) -> tuple[dict, dict]:
+    """Return a tree element and the blob of some content."""
+    sha = blob_sha(content)
+    return (
+        {"mode": mode, "type": "blob", "sha": sha},
+        {
+            "sha": sha,
+            "encoding": "base64",
+            "content": base64.b64encode(content).decode(),
+        },
+    )
+
+
+def serve_tree(stub, files: dict, truncated: bool = False):
+    """Answer requests for the tree of the app source, and its blobs."""
+    tree = []
+    for path, (element, data) in files.items():
+        tree.append({"path": path, **element})
+        if data is not None:
+            stub.route(
+                "GET", f"/repos/o/app/git/blobs/{element['sha']}", [(200, {}, data)]
+            )
+    stub.route(
+        "GET",
+        f"/repos/o/app/git/trees/{COMMIT}",
+        [(200, {}, {"sha": "e" * 40, "tree": tree, "truncated": truncated})],
+    )
+
+
+def serve_tarball(stub, files: dict):
+    """Answer requests for the tarball of the app source."""
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w:gz") as tar:
+        for path, content in files.items():
+            member = tarfile.TarInfo(f"o-app-{COMMIT[:7]}/{path}")
+            member.size = len(content)
+            tar.addfile(member, io.BytesIO(content))
+    stub.route("GET", f"/repos/o/app/tarball/{COMMIT}", [(200, {}, data.getvalue())])
+
+
+@pytest.fixture
+def app(github, tmp_path):
+    """Return an app with a delta source, without loading it."""
+    delta = App.__new__(App)
+    delta.github = github
+    delta.repository = SimpleNamespace(working_dir=str(tmp_path / "apps"))
+    delta.repository_target = "example"
+    delta.app_repository = github.make_repository("o/app")
+    delta.app_target = "app"
+    delta.staging_dir = None
+    delta.source = SOURCE_DELTA
+    delta.current_commit = github.make_commit(delta.app_repository, COMMIT)
+    os.makedirs(delta.app_dir)
+    yield delta
+    if getattr(delta, "source_dir", None):
+        shutil.rmtree(delta.source_dir, True)
+
+
+def read(directory: str, path: str) -> bytes:
+    """Read a file below a directory."""
+    with open(os.path.join(directory, *path.split("/")), "rb") as f:
+        return f.read()
+
+
+def test_downloads_changed_files_only(stub, app):
+    """Files the update uses are downloaded, unless the app has them already."""
+    config = blob(b"version: 1.0.0\n")
+    with open(os.path.join(app.app_dir, "config.yaml"), "wb") as f:
+        f.write(b"version: 1.0.0\n")
+    serve_tree(
+        stub,
+        {
+            "app/config.yaml": (config[0], None),
+            "app/README.md": blob(b"# App"),
+            "app/translations/en.yaml": blob(b"en: {}"),
+            "app/rootfs/run.sh": blob(b"#!/bin/sh"),
+            "DOCS.md": blob(b"# Docs"),
+            "app/DOCS.md": blob(b"../DOCS.md", MODE_SYMLINK),
+        },
+    )
+
+    app.download_delta()
+
+    assert read(app.source_dir, "config.yaml") == b"version: 1.0.0\n"
+    assert read(app.source_dir, "README.md") == b"# App"
+    assert read(app.source_dir, "translations/en.yaml") == b"en: {}"
+    assert not os.path.islink(os.path.join(app.source_dir, "DOCS.md"))
+    assert read(app.source_dir, "DOCS.md") == b"# Docs"
+    assert not os.path.exists(os.path.join(app.source_dir, "rootfs"))
+    assert not any(path.endswith(config[0]["sha"]) for _, path, _ in stub.requests)
+
+
+@pytest.mark.parametrize(
+    "files, truncated",
+    [
+        ({"app/README.md": blob(b"# App")}, True),
+        (
+            {
+                "docs": ({"mode": "040000", "type": "tree", "sha": "d" * 40}, None),
+                "app/README.md": blob(b"../docs", MODE_SYMLINK),
+            },
+            False,
+        ),
+    ],
+    ids=["truncated", "link-to-directory"],
+)
+def test_falls_back_to_archive(stub, app, files, truncated):
+    """The archive is downloaded when the tree cannot be used file by file."""
+    serve_tree(stub, files, truncated)
+    serve_tarball(stub, {"app/README.md": b"# From archive", "app/src/main.c": b""})
+
+    app.download_delta()
+
+    assert read(app.source_dir, "README.md") == b"# From archive"
+    assert stub.count("GET", f"/repos/o/app/tarball/{COMMIT}") == 1
+
+
+def test_keeps_static_directories_missing_from_source(tmp_path):
+    """Static directories are kept when the source has none, files are not."""
+    app = App.__new__(App)
+    app.source_dir = str(tmp_path / "source")
+    app.staging_dir = str(tmp_path / "apps")
+    app.written = set()
+    os.makedirs(app.source_dir)
+    os.makedirs(tmp_path / "apps" / "translations")
+    with open(
+        tmp_path / "apps" / "translations" / "en.yaml", "w", encoding="utf8"
+    ) as f:
+        f.write("en")
+    with open(tmp_path / "apps" / "DOCS.md", "w", encoding="utf8") as f:
+        f.write("docs")
+
+    app.update_static_files()
+
+    assert os.path.isfile(tmp_path / "apps" / "translations" / "en.yaml")
+    assert not os.path.exists(tmp_path / "apps" / "DOCS.md")
+    assert app.written == {"DOCS.md"}
@@ -0,0 +1,115 @@
+"""Tests for extracting a directory from a repository tarball."""
+
+from __future__ import annotations
+
+import io
+import os
+import tarfile
+import time
+
+import pytest
+import requests
+
+from repositoryupdater.archive import UnresolvedLinks, extract_subtree
+from repositoryupdater.github import GitHub
+
+
+def tarball(entries: dict) -> io.BytesIO:
+    """
+    Return a gzipped tarball wrapped in a top level directory, like GitHub's.
+
+    Entries map a path to the content of a file, to None for a directory,
+    or to `("link", target)` for a symbolic link.
+    """
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w:gz") as tar:
+        for path, content in entries.items():
+            member = tarfile.TarInfo(f"o-app-abc1234/{path}")
+            if content is None:
+                member.type = tarfile.DIRTYPE
+                member.mode = 0o755
+                tar.addfile(member)
+            elif isinstance(content, tuple):
+                member.type = tarfile.SYMTYPE
+                member.linkname = content[1]
+                tar.addfile(member)
+            else:
+                member.size = len(content)
+                member.mode = 0o755 if path.endswith(".sh") else 0o644
+                tar.addfile(member, io.BytesIO(content))
+    data.seek(0)
+    return data
+
+
+def read(path) -> bytes:
+    """Read a file."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_extracts_subtree(tmp_path):
+    """Only files below the path are extracted, without the path prefix."""
+    archive = tarball(
+        {
+            "README.md": b"root",
+            "app": None,
+            "app/config.yaml": b"version: 1",
+            "app/rootfs": None,
+            "app/rootfs/etc": None,
+            "app/rootfs/etc/run.sh": b"#!/bin/sh",
+            "application/config.yaml": b"other",
+        }
+    )
+    assert extract_subtree(archive, "/app/", str(tmp_path)) == 2
+    assert read(tmp_path / "config.yaml") == b"version: 1"
+    assert read(tmp_path / "rootfs" / "etc" / "run.sh") == b"#!/bin/sh"
+    assert os.access(tmp_path / "rootfs" / "etc" / "run.sh", os.X_OK)
+    assert sorted(os.listdir(tmp_path)) == ["config.yaml", "rootfs"]
+
+
+def test_follows_links_inside_subtree(tmp_path):
+    """Links are replaced by copies of the files they point to."""
+    archive = tarball(
+        {
+            "app/DOCS.md": ("link", "README.md"),
+            "app/README.md": b"# App",
+            "app/docs": None,
+            "app/docs/icon.png": ("link", "../images/icon.png"),
+            "app/images": None,
+            "app/images/icon.png": b"png",
+        }
+    )
+    assert extract_subtree(archive, "app", str(tmp_path)) == 4
+    assert not os.path.islink(tmp_path / "DOCS.md")
+    assert read(tmp_path / "DOCS.md") == b"# App"
+    assert read(tmp_path / "docs" / "icon.png") == b"png"
+
+
+def test_refuses_links_outside_subtree(tmp_path):
+    """Links to files that were not extracted cannot be followed."""
+    archive = tarball({"README.md": b"root", "app/README.md": ("link", "../README.md")})
+    with pytest.raises(UnresolvedLinks, match="README.md"):
+        extract_subtree(archive, "app", str(tmp_path))
+
+
+def test_download_uses_request_timeout(stub, tmp_path):
+    """Archives are downloaded within the configured request timeout."""
+    archive = tarball({"app": None, "app/config.yaml": b"version: 1"}).getvalue()
+
+    def slow(*_):
+        time.sleep(2.0)
+        return 200, {}, archive
+
+    stub.route("GET", "/repos/o/app/tarball/abc1234", [(200, {}, archive)])
+    stub.route("GET", "/repos/o/slow/tarball/abc1234", [slow])
+    github = GitHub("token", base_url=stub.url, timeout=1)
+    try:
+        repository = github.make_repository("o/app")
+        assert github.download_archive(repository, "abc1234", "/app/", tmp_path) == 1
+        assert read(tmp_path / "config.yaml") == b"version: 1"
+        with pytest.raises(requests.Timeout):
+            github.download_archive(
+                github.make_repository("o/slow"), "abc1234", "/app/", tmp_path
+            )
+    finally:
+        github.session.close()
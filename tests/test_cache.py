@@ -0,0 +1,92 @@
+"""Tests for the persistent, conditional GitHub API response cache."""
+
+from __future__ import annotations
+
+import os
+
+import requests
+
+from repositoryupdater.cache import ResponseCache
+from repositoryupdater.github import GitHub
+
+
+def revalidated(etag: str, data):
+    """Return a route answering 304 to requests that still have the ETag."""
+
+    def respond(handler, _):
+        if handler.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag}, data
+
+    return respond
+
+
+def client(stub, cache: ResponseCache, token: str = "token") -> GitHub:
+    """Return a GitHub client using the cache."""
+    return GitHub(token, base_url=stub.url, cache=cache, timeout=2)
+
+
+def test_serves_not_modified_from_cache(stub, tmp_path):
+    """Unchanged responses are revalidated, and served from the cache."""
+    stub.route("GET", "/repos/o/app", [revalidated('"v1"', {"name": "app"})])
+    github = client(stub, ResponseCache(str(tmp_path / "cache")))
+
+    for _ in range(2):
+        _, data = github.requester.requestJsonAndCheck("GET", "/repos/o/app")
+        assert data["name"] == "app"
+
+    assert stub.count("GET", "/repos/o/app") == 2
+    assert github.report.to_dict()["totals"]["not_modified"] == 1
+
+
+def test_keys_are_scoped_to_credentials_and_media_type():
+    """Responses for other tokens or media types are never shared."""
+    url = "https://api.github.com/repos/o/app"
+    keys = {
+        ResponseCache.key(url, {"Authorization": "token a"}),
+        ResponseCache.key(url, {"Authorization": "token b"}),
+        ResponseCache.key(url, {"Authorization": "token a", "Accept": "text/html"}),
+    }
+    assert len(keys) == 3
+
+
+def test_does_not_revalidate_for_other_tokens(stub, tmp_path):
+    """A response cached for one token is not revalidated for another."""
+    seen = []
+
+    def respond(handler, _):
+        seen.append(handler.headers.get("If-None-Match"))
+        return 200, {"ETag": '"v1"'}, {"name": "app"}
+
+    stub.route("GET", "/repos/o/app", [respond])
+    cache = ResponseCache(str(tmp_path / "cache"))
+    client(stub, cache, "first").requester.requestJsonAndCheck("GET", "/repos/o/app")
+    client(stub, cache, "second").requester.requestJsonAndCheck("GET", "/repos/o/app")
+    assert seen == [None, None]
+
+
+def response(body: str) -> requests.Response:
+    """Return a response that can be revalidated."""
+    stored = requests.Response()
+    stored.status_code = 200
+    stored.headers["ETag"] = '"%d"' % len(body)
+    stored.encoding = "utf-8"
+    stored._content = body.encode()  # pylint: disable=protected-access
+    return stored
+
+
+def test_evicts_least_recently_used(tmp_path):
+    """Once full, the responses that were not used the longest are removed."""
+    cache = ResponseCache(str(tmp_path / "cache"), max_size=3000)
+    for index, name in enumerate(("old", "used", "new")):
+        cache.store(name, response(name * 300))
+        os.utime(cache.path(name), (index, index))
+    assert cache.get("used") is not None
+
+    cache.store("newest", response("x" * 900))
+
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("newest") is not None
+    assert cache.size <= 3000
+    assert cache.size == sum(size for _, size, _ in cache.entries())
@@ -0,0 +1,87 @@
+"""Tests for the events the daemon acts on, and how."""
+
+from __future__ import annotations
+
+from repositoryupdater.daemon import Daemon, is_relevant
+
+REPOSITORY = {"full_name": "o/app", "default_branch": "main"}
+
+
+def test_app_events_are_relevant():
+    """Simple app events always trigger an update."""
+    assert is_relevant({"app": "example"})
+
+
+def test_published_releases_are_relevant():
+    """Releases trigger an update once published, with or without the kind."""
+    for action in ("published", "released", "prereleased"):
+        event = {"action": action, "release": {}, "repository": REPOSITORY}
+        assert is_relevant(event, "release")
+        assert is_relevant(event)
+    event = {"action": "edited", "release": {}, "repository": REPOSITORY}
+    assert not is_relevant(event, "release")
+
+
+def test_only_pushes_to_the_default_branch_are_relevant():
+    """Pushes to other branches or tags are ignored."""
+    assert is_relevant({"ref": "refs/heads/main", "repository": REPOSITORY}, "push")
+    assert is_relevant({"ref": "refs/heads/main", "repository": REPOSITORY})
+    for ref in ("refs/heads/feature", "refs/tags/v1.0.0"):
+        assert not is_relevant({"ref": ref, "repository": REPOSITORY}, "push")
+
+
+def test_other_webhooks_are_ignored():
+    """Events like pings, issues and stars do not trigger an update."""
+    for kind in ("ping", "issues", "star", "fork"):
+        assert not is_relevant({"action": "created", "repository": REPOSITORY}, kind)
+
+
+class FailingRepository:
+    """Apps repository whose first push fails, recording what is done."""
+
+    def __init__(self):
+        """Initialize a repository that fails to push once."""
+        self.calls = []
+        self.failures = 1
+
+    def refresh(self) -> bool:
+        """Discard local changes, nobody else pushed in the meantime."""
+        self.calls.append("refresh")
+        return False
+
+    def reload_apps(self, app: str, reload_config: bool = False):
+        """Record which apps are loaded again."""
+        self.calls.append(("reload", app, reload_config))
+
+    def update(self):
+        """Update the apps, failing to push the first time."""
+        self.calls.append("update")
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("push failed")
+
+
+def test_reloads_all_apps_after_a_failed_push():
+    """After a failed push, the next event loads all apps from the repository."""
+    repository = FailingRepository()
+    daemon = Daemon(repository)
+
+    daemon.apply("example")
+    assert repository.calls == [
+        "refresh",
+        ("reload", "example", False),
+        "update",
+        "refresh",
+    ]
+
+    repository.calls.clear()
+    daemon.apply("example")
+    daemon.apply("example")
+    assert repository.calls == [
+        "refresh",
+        ("reload", "example", True),
+        "update",
+        "refresh",
+        ("reload", "example", False),
+        "update",
+    ]
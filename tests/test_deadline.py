@@ -0,0 +1,41 @@
+"""Tests for the ordering of app updates under a deadline."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from repositoryupdater.deadline import priority
+
+
+def app(name: str, released: int | None = None, committed: str | None = None):
+    """Return a pending app update with a release or an edge commit."""
+    return SimpleNamespace(
+        name=name,
+        latest_is_release=released is not None,
+        latest_release=(
+            SimpleNamespace(created_at=datetime(2024, released, 1, tzinfo=timezone.utc))
+            if released
+            else None
+        ),
+        latest_commit=SimpleNamespace(last_modified=committed),
+    )
+
+
+def test_releases_first_then_dated_edge_commits():
+    """Oldest releases go first, edge commits without a date keep their order."""
+    pending = [
+        app("edge-a"),
+        app("new", released=3),
+        app("edge-dated", committed="Mon, 01 Jan 2024 00:00:00 GMT"),
+        app("edge-b"),
+        app("old", released=1),
+    ]
+    pending.sort(key=priority)
+    assert [update.name for update in pending] == [
+        "old",
+        "new",
+        "edge-dated",
+        "edge-a",
+        "edge-b",
+    ]
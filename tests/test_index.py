@@ -0,0 +1,95 @@
+"""Tests for the tag and release index of app source repositories."""
+
+from __future__ import annotations
+
+from repositoryupdater.const import CHANNEL_STABLE
+from repositoryupdater.index import SourceIndex
+
+REFS = "%s\tHEAD\n%s\trefs/tags/v1.0.0\n" % ("a" * 40, "1" * 40)
+
+
+def release(number: int, tag: str) -> dict:
+    """Return the REST data of a release."""
+    return {
+        "id": number,
+        "tag_name": tag,
+        "draft": False,
+        "prerelease": False,
+        "created_at": "2024-01-01T00:00:00Z",
+        "url": f"https://api.github.com/repos/o/app/releases/{number}",
+    }
+
+
+def test_looks_up_tags_created_after_listing(stub, github):
+    """Releases newer than the listed tags resolve their tag using the API."""
+    stub.route(
+        "GET",
+        "/repos/o/app/releases",
+        [(200, {}, [release(3, "v3.0.0"), release(2, "v2.0.0")])],
+    )
+    # v3.0.0 was deleted, v2.0.0 is an annotated tag created after listing
+    stub.route(
+        "GET",
+        "/repos/o/app/git/ref/tags/v2.0.0",
+        [
+            (
+                200,
+                {},
+                {
+                    "ref": "refs/tags/v2.0.0",
+                    "object": {"sha": "b" * 40, "type": "tag", "url": "x"},
+                },
+            )
+        ],
+    )
+    stub.route(
+        "GET",
+        "/repos/o/app/git/tags/" + "b" * 40,
+        [
+            (
+                200,
+                {},
+                {
+                    "sha": "b" * 40,
+                    "tag": "v2.0.0",
+                    "object": {"sha": "2" * 40, "type": "commit", "url": "x"},
+                },
+            )
+        ],
+    )
+    index = SourceIndex(github.make_repository("o/app"), REFS)
+
+    latest = index.latest_release(CHANNEL_STABLE)
+
+    assert latest.tag_name == "v2.0.0"
+    assert index.release_commit("v2.0.0") == "2" * 40
+    assert index.release_commit("v1.0.0") == "1" * 40
+    assert stub.count("GET", "/repos/o/app/git/ref/tags/v2.0.0") == 1
+
+
+def test_release_on_existing_tag_changes_fingerprint(stub, github):
+    """Publishing a release on a tag that existed already is picked up."""
+    releases = []
+    stub.route("GET", "/repos/o/app/releases", [lambda *_: (200, {}, releases)])
+    before = SourceIndex(github.make_repository("o/app"), REFS)
+    assert before.fingerprint
+    assert before.latest_release(CHANNEL_STABLE) is None
+
+    releases.append(release(1, "v1.0.0"))
+    after = SourceIndex(github.make_repository("o/app"), REFS)
+    assert after.fingerprint != before.fingerprint
+    assert after.latest_release(CHANNEL_STABLE).tag_name == "v1.0.0"
+    assert after.release_commit("v1.0.0") == "1" * 40
+
+
+def test_promoted_prerelease_changes_fingerprint(stub, github):
+    """Turning a prerelease into a release is picked up."""
+    prerelease = {**release(1, "v1.0.0"), "prerelease": True}
+    stub.route(
+        "GET",
+        "/repos/o/app/releases",
+        [(200, {}, [prerelease]), (200, {}, [release(1, "v1.0.0")])],
+    )
+    before = SourceIndex(github.make_repository("o/app"), REFS).fingerprint
+    after = SourceIndex(github.make_repository("o/app"), REFS).fingerprint
+    assert before != after
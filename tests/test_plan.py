@@ -0,0 +1,61 @@
+"""Tests for splitting runs into plans of shards."""
+
+from __future__ import annotations
+
+import base64
+import os
+
+import pytest
+
+from repositoryupdater.plan import check_shards, write_files
+from repositoryupdater.publisher import MODE_EXECUTABLE, MODE_FILE
+
+
+def plan(shard: list[int] | None) -> dict:
+    """Return a plan of a shard, without apps."""
+    return {"shard": shard, "apps": []}
+
+
+def test_complete_shards():
+    """All shards of a split, in any order, can be applied."""
+    check_shards([plan([2, 3]), plan([3, 3]), plan([1, 3])])
+    check_shards([plan(None)])
+
+
+@pytest.mark.parametrize(
+    "shards, message",
+    [
+        ([[1, 2]], "missing: 2/2"),
+        ([[1, 2], [1, 2]], "more than once: 1/2"),
+        ([[1, 2], [2, 3]], "different splits"),
+        ([None, [1, 1]], "more than once: 1/1"),
+    ],
+)
+def test_incomplete_shards(shards, message):
+    """Missing, duplicate and mixed shards are refused."""
+    with pytest.raises(ValueError, match=message):
+        check_shards([plan(shard) for shard in shards])
+
+
+def test_writes_file_modes(tmp_path):
+    """Planned files are written with their modes, removed files removed."""
+    os.makedirs(tmp_path / "app")
+    (tmp_path / "app" / "old.sh").write_text("old")
+    write_files(
+        str(tmp_path),
+        {
+            "app/run.sh": {
+                "content": base64.b64encode(b"#!/bin/sh").decode("ascii"),
+                "mode": MODE_EXECUTABLE,
+            },
+            "app/README.md": {
+                "content": base64.b64encode(b"# App").decode("ascii"),
+                "mode": MODE_FILE,
+            },
+            "app/old.sh": None,
+        },
+    )
+    assert os.access(tmp_path / "app" / "run.sh", os.X_OK)
+    assert not os.access(tmp_path / "app" / "README.md", os.X_OK)
+    assert (tmp_path / "app" / "README.md").read_bytes() == b"# App"
+    assert not os.path.exists(tmp_path / "app" / "old.sh")
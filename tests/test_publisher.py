@@ -0,0 +1,208 @@
+"""Tests for publishing to the apps repository through the Git Data API."""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+
+import pytest
+from git import Repo
+
+from repositoryupdater.publisher import (
+    MODE_EXECUTABLE,
+    MODE_FILE,
+    ApiPublisher,
+    PushRejected,
+    blob_sha,
+)
+
+HEAD = "a" * 40
+TREE = "b" * 40
+CONFIG = b"version: 1.0.0\n"
+
+
+@pytest.fixture
+def apps(stub):
+    """Answer the requests checking out the head of the apps repository."""
+    stub.route(
+        "GET",
+        "/repos/o/apps/git/ref/heads/main",
+        [
+            (
+                200,
+                {},
+                {
+                    "ref": "refs/heads/main",
+                    "url": stub.url + "/repos/o/apps/git/refs/heads/main",
+                    "object": {"sha": HEAD, "type": "commit", "url": "x"},
+                },
+            )
+        ],
+    )
+    stub.route(
+        "GET",
+        "/repos/o/apps/git/commits/" + HEAD,
+        [(200, {}, {"sha": HEAD, "tree": {"sha": TREE, "url": "x"}})],
+    )
+    stub.route(
+        "GET",
+        "/repos/o/apps/git/trees/" + TREE,
+        [
+            (
+                200,
+                {},
+                {
+                    "sha": TREE,
+                    "truncated": False,
+                    "tree": [
+                        {
+                            "path": "app/config.yaml",
+                            "mode": MODE_FILE,
+                            "type": "blob",
+                            "sha": blob_sha(CONFIG),
+                        },
+                        {
+                            "path": "app/icon.png",
+                            "mode": MODE_FILE,
+                            "type": "blob",
+                            "sha": "c" * 40,
+                        },
+                    ],
+                },
+            )
+        ],
+    )
+    stub.route(
+        "GET",
+        "/repos/o/apps/git/blobs/" + blob_sha(CONFIG),
+        [
+            (
+                200,
+                {},
+                {
+                    "sha": blob_sha(CONFIG),
+                    "encoding": "base64",
+                    "content": base64.b64encode(CONFIG).decode("ascii"),
+                },
+            )
+        ],
+    )
+    stub.route("POST", "/repos/o/apps/git/trees", [(201, {}, {"sha": "d" * 40})])
+    stub.route("POST", "/repos/o/apps/git/commits", [(201, {}, {"sha": "e" * 40})])
+
+
+def publisher(github, working_dir, **attributes) -> ApiPublisher:
+    """Return a publisher of the apps repository, checked out."""
+    repository = github.make_repository("o/apps", default_branch="main", **attributes)
+    checkout = ApiPublisher(github, repository, str(working_dir))
+    checkout.checkout()
+    return checkout
+
+
+def test_checks_out_configs_only(stub, github, apps, tmp_path):
+    """Configs are downloaded, other files are empty placeholders."""
+    checkout = publisher(github, tmp_path / "work")
+    with open(tmp_path / "work" / "app" / "config.yaml", "rb") as f:
+        assert f.read() == CONFIG
+    assert os.path.getsize(tmp_path / "work" / "app" / "icon.png") == 0
+    assert checkout.head == HEAD
+    assert stub.count("GET", "/repos/o/apps/git/blobs/" + "c" * 40) == 0
+
+
+def test_pushes_tree_commit_and_ref(stub, github, apps, tmp_path):
+    """Changes are pushed as a tree and commit, then the branch is moved."""
+    stub.route("PATCH", "/repos/o/apps/git/refs/heads/main", [(200, {}, {})])
+    checkout = publisher(github, tmp_path / "work")
+    (tmp_path / "work" / "app" / "config.yaml").write_bytes(b"version: 2.0.0\n")
+    (tmp_path / "work" / "app" / "run.sh").write_bytes(b"#!/bin/sh\n")
+    os.chmod(tmp_path / "work" / "app" / "run.sh", 0o755)
+    assert checkout.commit(["app"], "Upgrade")
+    assert not checkout.commit(["app"], "Nothing changed")
+
+    checkout.push()
+
+    writes = [
+        (verb, path.partition("?")[0], json.loads(body or b"null"))
+        for verb, path, body in stub.requests
+        if verb != "GET"
+    ]
+    assert [(verb, path) for verb, path, _ in writes] == [
+        ("POST", "/repos/o/apps/git/trees"),
+        ("POST", "/repos/o/apps/git/commits"),
+        ("PATCH", "/repos/o/apps/git/refs/heads/main"),
+    ]
+    tree, commit, ref = (body for _, _, body in writes)
+    assert tree["base_tree"] == TREE
+    assert {(element["path"], element["mode"]) for element in tree["tree"]} == {
+        ("app/config.yaml", MODE_FILE),
+        ("app/run.sh", MODE_EXECUTABLE),
+    }
+    assert commit == {"message": "Upgrade", "tree": "d" * 40, "parents": [HEAD]}
+    assert ref["sha"] == "e" * 40
+    assert checkout.head == "e" * 40
+
+
+def test_rejected_ref_update(stub, github, apps, tmp_path):
+    """A ref update that is not a fast-forward is a rejected push."""
+    stub.route(
+        "PATCH",
+        "/repos/o/apps/git/refs/heads/main",
+        [(422, {}, {"message": "Update is not a fast forward"})],
+    )
+    checkout = publisher(github, tmp_path / "work")
+    (tmp_path / "work" / "app" / "config.yaml").write_bytes(b"version: 2.0.0\n")
+    checkout.commit(["app/config.yaml"], "Upgrade")
+    with pytest.raises(PushRejected):
+        checkout.push()
+    assert checkout.head == HEAD
+
+
+def test_pushes_many_changes_using_git(stub, stub_user, github, remote, tmp_path):
+    """Beyond the maximum number of changes, a clone is pushed instead."""
+    bare = remote("apps", {"app/config.yaml": CONFIG.decode()})
+    head = Repo(bare).head.commit.hexsha
+    checkout = ApiPublisher(
+        github,
+        github.make_repository(
+            "o/apps", default_branch="main", clone_url=f"file://{bare}"
+        ),
+        str(tmp_path / "work"),
+        max_changes=1,
+    )
+    checkout.head = head
+    os.makedirs(tmp_path / "work" / "app")
+    (tmp_path / "work" / "app" / "a.md").write_text("a")
+    (tmp_path / "work" / "app" / "b.md").write_text("b")
+    checkout.commit(["app"], "Add docs")
+
+    checkout.push()
+
+    pushed = Repo(bare).head.commit
+    assert pushed.message.strip() == "Add docs"
+    assert pushed.parents[0].hexsha == head
+    assert {blob.path for blob in pushed.tree.traverse()} >= {"app/a.md", "app/b.md"}
+    assert not any(verb == "POST" for verb, _, _ in stub.requests)
+    assert checkout.head == pushed.hexsha
+
+
+def test_git_push_refuses_moved_branch(stub, stub_user, github, remote, tmp_path):
+    """Pushing using git does not replay changes onto someone else's push."""
+    bare = remote("apps", {"app/config.yaml": CONFIG.decode()})
+    head = Repo(bare).head.commit.hexsha
+    checkout = ApiPublisher(
+        github,
+        github.make_repository(
+            "o/apps", default_branch="main", clone_url=f"file://{bare}"
+        ),
+        str(tmp_path / "work"),
+        max_changes=0,
+    )
+    checkout.head = HEAD
+    os.makedirs(tmp_path / "work" / "app")
+    (tmp_path / "work" / "app" / "a.md").write_text("a")
+    checkout.commit(["app"], "Add docs")
+
+    with pytest.raises(PushRejected):
+        checkout.push()
+    assert Repo(bare).head.commit.hexsha == head
@@ -0,0 +1,58 @@
+"""Tests for reporting the GitHub API usage of a run."""
+
+from __future__ import annotations
+
+
+def rate_limit(remaining: int, reset: int) -> tuple:
+    """Return a `GET /rate_limit` response."""
+    core = {"limit": 5000, "used": 5000 - remaining, "remaining": remaining}
+    graphql = {"limit": 5000, "used": 0, "remaining": 5000}
+    return (
+        200,
+        {},
+        {
+            "resources": {
+                "core": {**core, "reset": reset},
+                "graphql": {**graphql, "reset": reset},
+            },
+            "rate": {**core, "reset": reset},
+        },
+    )
+
+
+def test_reports_rate_limit_consumption(stub, github):
+    """The consumption is the difference of the limits before and after."""
+    stub.route(
+        "GET",
+        "/rate_limit",
+        [rate_limit(4990, 1700000000), rate_limit(4950, 1700000000)],
+    )
+    github.record_rate_limits("before")
+    github.record_rate_limits("after")
+    report = github.report.to_dict()
+
+    assert report["rate_limit"]["core"]["used"] == 40
+    assert "graphql" not in report["rate_limit"]
+    # Reading the rate limits is free, and not part of the run
+    assert report["totals"] == {}
+
+
+def test_reports_lower_bound_across_a_reset(stub, github):
+    """Only a lower bound is known when the limit reset during the run."""
+    stub.route(
+        "GET", "/rate_limit", [rate_limit(10, 1700000000), rate_limit(4980, 1700003600)]
+    )
+    github.record_rate_limits("before")
+    github.record_rate_limits("after")
+    usage = github.report.to_dict()["rate_limit"]["core"]
+
+    assert usage["used"] is None
+    assert usage["used_at_least"] == 20
+
+
+def test_missing_rate_limits_are_not_reported(stub, github):
+    """Servers without rate limits do not break the report."""
+    github.record_rate_limits("before")
+    github.record_rate_limits("after")
+
+    assert github.report.to_dict()["rate_limit"] == {}
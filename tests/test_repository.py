@@ -0,0 +1,195 @@
+"""Tests for committing to and pushing the apps repository."""
+
+from __future__ import annotations
+
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+import yaml
+from git import Repo
+
+from repositoryupdater import repository as repository_module
+from repositoryupdater.publisher import PushRejected, RebaseConflict
+from repositoryupdater.repository import Repository
+
+FILES = {
+    "README.md": "# Apps\n",
+    "app/config.yaml": "version: 1.0.0\n",
+    "other/config.yaml": "version: 1.0.0\n",
+}
+
+
+def clone(bare: str, directory: str) -> Repo:
+    """Clone the apps repository, ready to commit."""
+    repo = Repo.clone_from(f"file://{bare}", directory)
+    repo.git.config("user.name", "Updater")
+    repo.git.config("user.email", "updater@example.com")
+    return repo
+
+
+def write(repo: Repo, path: str, content: str):
+    """Write a file into a working tree."""
+    with open(os.path.join(repo.working_dir, path), "w", encoding="utf8") as f:
+        f.write(content)
+
+
+def push_upstream(bare: str, directory: str, path: str, content: str):
+    """Push a change someone else made to the apps repository."""
+    other = clone(bare, directory) if not os.path.isdir(directory) else Repo(directory)
+    other.git.pull("-q")
+    write(other, path, content)
+    other.git.commit("-qam", f"Change {path}")
+    other.git.push("-q")
+
+
+@pytest.fixture
+def bare(remote) -> str:
+    """Return the path of the remote apps repository."""
+    return remote("apps", FILES)
+
+
+@pytest.fixture
+def apps(github, bare, tmp_path, monkeypatch):
+    """Return the apps repository, loaded from a local clone without apps."""
+    monkeypatch.setattr(repository_module, "PUSH_BACKOFF_BASE", 0)
+    repository = Repository.__new__(Repository)
+    repository.github = github
+    repository.git_repo = clone(bare, str(tmp_path / "work"))
+    repository.publisher = None
+    repository.apps = []
+    repository.apps_config = {}
+    repository.shard = None
+    repository.push_attempts = 3
+    repository.deadline = None
+    return repository
+
+
+def committed(repo: Repo, rev: str = "HEAD") -> set[str]:
+    """Return the paths changed by a commit."""
+    return set(repo.git.show("--name-only", "--format=", rev).split())
+
+
+def test_commits_only_the_given_paths(apps, tmp_path):
+    """Other changes in the working tree are left out of the commit."""
+    repo = apps.git_repo
+    write(repo, "app/config.yaml", "version: 2.0.0\n")
+    write(repo, "other/config.yaml", "version: 2.0.0\n")
+    write(repo, "untracked.txt", "scratch")
+    os.remove(os.path.join(repo.working_dir, "README.md"))
+
+    assert apps.commit_paths(["app", "README.md"], "Update app")
+
+    assert committed(repo) == {"app/config.yaml", "README.md"}
+    assert repo.head.commit.message.strip() == "Update app"
+    assert repo.git.status("--porcelain").splitlines() == [
+        " M other/config.yaml",
+        "?? untracked.txt",
+    ]
+    assert not apps.commit_paths(["app"], "Nothing changed")
+
+
+def test_rebases_and_pushes_after_rejection(apps, bare, tmp_path):
+    """A push rejected for someone else's changes is rebased and retried."""
+    push_upstream(bare, str(tmp_path / "other"), "other/config.yaml", "v2\n")
+    write(apps.git_repo, "app/config.yaml", "version: 2.0.0\n")
+    apps.commit_paths(["app"], "Update app")
+
+    apps.push()
+
+    upstream = Repo(bare)
+    assert upstream.head.commit.message.strip() == "Update app"
+    assert committed(upstream) == {"app/config.yaml"}
+    assert upstream.head.commit.parents[0].message.strip() == (
+        "Change other/config.yaml"
+    )
+
+
+def test_conflicts_are_not_retried(apps, bare, tmp_path, monkeypatch):
+    """Changes to the same files upstream fail the push instead of retrying."""
+    push_upstream(bare, str(tmp_path / "other"), "app/config.yaml", "theirs\n")
+    upstream = Repo(bare).head.commit.hexsha
+    write(apps.git_repo, "app/config.yaml", "version: 2.0.0\n")
+    apps.commit_paths(["app"], "Update app")
+    pushes = []
+    push_commits = apps.push_commits
+
+    def push():
+        pushes.append(len(pushes))
+        push_commits()
+
+    monkeypatch.setattr(apps, "push_commits", push)
+
+    with pytest.raises(RebaseConflict, match="app/config.yaml"):
+        apps.push()
+
+    assert len(pushes) == 1
+    assert Repo(bare).head.commit.hexsha == upstream
+
+
+def test_gives_up_after_push_attempts(apps, bare, tmp_path, monkeypatch):
+    """Pushes keep being rejected at most as often as there are attempts."""
+    write(apps.git_repo, "app/config.yaml", "version: 2.0.0\n")
+    apps.commit_paths(["app"], "Update app")
+    attempts = []
+    push_commits = apps.push_commits
+
+    def race():
+        attempts.append(len(attempts))
+        push_upstream(
+            bare, str(tmp_path / "other"), "other/config.yaml", f"{attempts}\n"
+        )
+        push_commits()
+
+    monkeypatch.setattr(apps, "push_commits", race)
+
+    with pytest.raises(PushRejected):
+        apps.push()
+    assert len(attempts) == apps.push_attempts
+
+
+def test_concurrent_loading_keeps_output_grouped(github, stub, capsys):
+    """Apps loaded concurrently write their output in order, sharing one pool."""
+    targets = ["first", "second", "third", "fourth"]
+    for target in targets:
+        stub.route("GET", f"/apps/{target}", [(200, {}, {})])
+    config = {
+        "channel": "stable",
+        "apps": {target: {"repository": f"owner/{target}"} for target in targets},
+    }
+    repository = Repository.__new__(Repository)
+    repository.github = github
+    repository.github_repository = SimpleNamespace(
+        get_contents=lambda path: SimpleNamespace(
+            decoded_content=yaml.safe_dump(config, sort_keys=False)
+        )
+    )
+    repository.apps = []
+    repository.shard = None
+    repository.graphql = False
+    repository.concurrency = 2
+
+    def load_app(target, app_config, app, resolved):
+        print(f"Loading {target}")
+        # Apps listed first finish last
+        time.sleep(0.05 * (len(targets) - targets.index(target)))
+        github.session.request("GET", f"{stub.url}/apps/{target}", {})
+        print(f"Loaded {target}")
+        return target
+
+    repository.load_app = load_app
+    repository.load_repository(None)
+
+    assert repository.apps == targets
+    lines = [
+        line for line in capsys.readouterr().out.splitlines() if line.startswith("Load")
+    ]
+    assert lines == [
+        line for target in targets for line in (f"Loading {target}", f"Loaded {target}")
+    ]
+    pools = github.session.http.get_adapter(stub.url).poolmanager.pools
+    assert len(pools) == 1
+    pool = pools[next(iter(pools.keys()))]
+    assert pool.num_requests == len(targets)
+    assert pool.num_connections <= repository.concurrency
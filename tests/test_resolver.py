@@ -0,0 +1,100 @@
+"""Tests for resolving app versions using GraphQL."""
+
+from __future__ import annotations
+
+import json
+
+from repositoryupdater.const import CHANNEL_STABLE
+from repositoryupdater.resolver import RELEASES_LIMIT, GraphQLResolver
+
+COMMIT = {"oid": "a" * 40, "committedDate": "2024-01-01T00:00:00Z"}
+
+
+def release(number: int, prerelease: bool) -> dict:
+    """Return the GraphQL data of a release."""
+    return {
+        "databaseId": number,
+        "tagName": f"v1.0.{number}",
+        "name": f"1.0.{number}",
+        "description": "",
+        "isDraft": False,
+        "isPrerelease": prerelease,
+        "createdAt": "2024-01-01T00:00:00Z",
+        "url": f"https://github.com/o/app/releases/{number}",
+        "tagCommit": {"oid": f"{number:040d}"},
+    }
+
+
+def test_pages_through_releases_without_a_stable_one(stub, github):
+    """Releases beyond the first page are queried, when none matched."""
+    newest = [release(number, True) for number in range(100, 100 - RELEASES_LIMIT, -1)]
+
+    def respond(handler, body):
+        query = json.loads(body)
+        if "after:" in query["query"]:
+            assert query["variables"]["cursor"] == "cursor1"
+            releases = {
+                "pageInfo": {"hasNextPage": False, "endCursor": "cursor2"},
+                "nodes": [release(5, True), release(4, False)],
+            }
+            return 200, {}, {"data": {"app": {"releases": releases}}}
+        app = {
+            "nameWithOwner": "o/app",
+            "url": "https://github.com/o/app",
+            "defaultBranchRef": {"name": "main", "target": COMMIT},
+            "releases": {
+                "pageInfo": {"hasNextPage": True, "endCursor": "cursor1"},
+                "nodes": newest,
+            },
+        }
+        return 200, {}, {"data": {"app0": app}}
+
+    stub.route("POST", "/graphql", [respond])
+    resolved = GraphQLResolver(github, CHANNEL_STABLE).resolve_versions(
+        {"app": {"repository": "o/app", "target": "app", "version": None}}
+    )["app"]
+
+    assert resolved.latest_version == "1.0.4"
+    assert resolved.latest_commit.sha == f"{4:040d}"
+    assert stub.count("POST", "/graphql") == 2
+
+
+def test_does_not_page_when_a_release_matched(stub, github):
+    """Only the newest releases are queried, when one of them matched."""
+    app = {
+        "nameWithOwner": "o/app",
+        "url": "https://github.com/o/app",
+        "defaultBranchRef": {"name": "main", "target": COMMIT},
+        "releases": {
+            "pageInfo": {"hasNextPage": True, "endCursor": "cursor1"},
+            "nodes": [release(2, True), release(1, False)],
+        },
+    }
+    stub.route("POST", "/graphql", [(200, {}, {"data": {"app0": app}})])
+    resolved = GraphQLResolver(github, CHANNEL_STABLE).resolve_versions(
+        {"app": {"repository": "o/app", "target": "app", "version": None}}
+    )["app"]
+
+    assert resolved.latest_version == "1.0.1"
+    assert stub.count("POST", "/graphql") == 1
+
+
+def test_skips_releases_of_deleted_tags(stub, github):
+    """Releases whose tag no longer exists give way to the next release."""
+    deleted = {**release(3, False), "tagCommit": None}
+    app = {
+        "nameWithOwner": "o/app",
+        "url": "https://github.com/o/app",
+        "defaultBranchRef": {"name": "main", "target": COMMIT},
+        "releases": {
+            "pageInfo": {"hasNextPage": False, "endCursor": "cursor1"},
+            "nodes": [deleted, release(2, True), release(1, False)],
+        },
+    }
+    stub.route("POST", "/graphql", [(200, {}, {"data": {"app0": app}})])
+    resolved = GraphQLResolver(github, CHANNEL_STABLE).resolve_versions(
+        {"app": {"repository": "o/app", "target": "app", "version": None}}
+    )["app"]
+
+    assert resolved.latest_release.tag_name == "v1.0.1"
+    assert resolved.latest_commit.sha == f"{1:040d}"
@@ -0,0 +1,104 @@
+"""Tests for the pacing and retrying of GitHub API requests."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+import requests
+
+from repositoryupdater import scheduler
+
+OK = (200, {}, {})
+
+
+@pytest.fixture(autouse=True)
+def quick_retries(monkeypatch):
+    """Keep the waits in between retries short."""
+    monkeypatch.setattr(scheduler, "BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(scheduler, "SECONDARY_RATE_WAIT", 0.01)
+
+
+def test_retries_after_retry_after(stub, github):
+    """Secondary rate limits are retried after the time they ask for."""
+    stub.route("GET", "/x", [(429, {"Retry-After": "0"}, {}), OK])
+    response = github.session.request("GET", stub.url + "/x", {})
+    assert response.status_code == 200
+    assert stub.count("GET", "/x") == 2
+
+
+def test_retries_exhausted_rate_limit(stub, github):
+    """Exhausted rate limits are retried once they reset."""
+    reset = str(int(time.time()) - 5)
+    limited = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset}
+    stub.route("POST", "/x", [(403, limited, {"message": "rate limit"}), OK])
+    response = github.session.request("POST", stub.url + "/x", {}, data="{}")
+    assert response.status_code == 200
+    assert stub.count("POST", "/x") == 2
+
+
+def test_ignores_malformed_rate_limit_headers(stub, github):
+    """Rate limit headers that are not numbers do not fail the request."""
+    limited = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "soon"}
+    stub.route("GET", "/x", [(403, limited, {}), OK])
+    response = github.session.request("GET", stub.url + "/x", {})
+    assert response.status_code == 200
+    assert stub.count("GET", "/x") == 2
+
+
+def test_retries_server_errors_of_reads_only(stub, github):
+    """Server errors are retried for GET requests, but not for POST requests."""
+    stub.route("GET", "/x", [(502, {}, {}), OK])
+    stub.route("POST", "/x", [(502, {}, {}), OK])
+    assert github.session.request("GET", stub.url + "/x", {}).status_code == 200
+    assert stub.count("GET", "/x") == 2
+    response = github.session.request("POST", stub.url + "/x", {}, data="{}")
+    assert response.status_code == 502
+    assert stub.count("POST", "/x") == 1
+
+
+def test_long_waits_do_not_pause_other_requests(stub, github):
+    """A rate limit that is given up on does not hold back other requests."""
+    stub.route("GET", "/x", [(429, {"Retry-After": "3600"}, {})])
+    response = github.session.request("GET", stub.url + "/x", {})
+    assert response.status_code == 429
+    assert stub.count("GET", "/x") == 1
+    assert github.session.scheduler.paused_until == 0.0
+
+
+def slow_then_ok(delay: float):
+    """Return responses that are too slow the first time only."""
+    calls = []
+
+    def respond(*_):
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(delay)
+        return OK
+
+    return respond
+
+
+def test_retries_timed_out_reads_with_jitter(stub, github, monkeypatch):
+    """Reads that time out are retried, after a randomized delay."""
+    delays = []
+
+    def uniform(low, high):
+        delays.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(scheduler.random, "uniform", uniform)
+    stub.route("GET", "/x", [slow_then_ok(1.0)])
+    response = github.session.request("GET", stub.url + "/x", {}, timeout=0.3)
+    assert response.status_code == 200
+    assert stub.count("GET", "/x") == 2
+    assert delays == [(0, scheduler.BACKOFF_BASE)]
+
+
+@pytest.mark.parametrize("verb", ["POST", "PATCH"])
+def test_does_not_retry_timed_out_writes(stub, github, verb):
+    """Writes that time out may have been applied, so they are not repeated."""
+    stub.route(verb, "/x", [slow_then_ok(1.0)])
+    with pytest.raises(requests.Timeout):
+        github.session.request(verb, stub.url + "/x", {}, data="{}", timeout=0.3)
+    assert stub.count(verb, "/x") == 1
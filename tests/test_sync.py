@@ -0,0 +1,62 @@
+"""Tests for syncing app files by content."""
+
+from __future__ import annotations
+
+import os
+
+from repositoryupdater.sync import sync
+
+
+def write(path, content: str):
+    """Write a file, creating its directory."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf8") as f:
+        f.write(content)
+
+
+def read(path) -> str:
+    """Read a file."""
+    with open(path, encoding="utf8") as f:
+        return f.read()
+
+
+def test_unchanged_files_are_not_written(tmp_path):
+    """Files with the same content and mode are left alone."""
+    write(tmp_path / "source" / "translations" / "en.yaml", "en")
+    write(tmp_path / "apps" / "translations" / "en.yaml", "en")
+    os.utime(tmp_path / "apps" / "translations" / "en.yaml", (0, 0))
+
+    assert not sync(str(tmp_path / "source"), str(tmp_path / "apps"), "translations")
+    assert os.stat(tmp_path / "apps" / "translations" / "en.yaml").st_mtime == 0
+
+
+def test_changed_files_are_written(tmp_path):
+    """Files with other content or another mode are copied."""
+    write(tmp_path / "source" / "translations" / "en.yaml", "new")
+    write(tmp_path / "source" / "translations" / "de.yaml", "de")
+    write(tmp_path / "apps" / "translations" / "en.yaml", "old")
+    write(tmp_path / "apps" / "translations" / "de.yaml", "de")
+    os.chmod(tmp_path / "source" / "translations" / "de.yaml", 0o755)
+
+    changes = sync(str(tmp_path / "source"), str(tmp_path / "apps"), "translations")
+
+    assert changes == {"translations/en.yaml", "translations/de.yaml"}
+    assert read(tmp_path / "apps" / "translations" / "en.yaml") == "new"
+    assert os.access(tmp_path / "apps" / "translations" / "de.yaml", os.X_OK)
+
+
+def test_removed_files_are_removed(tmp_path):
+    """Files and directories the source no longer has are removed."""
+    write(tmp_path / "source" / "translations" / "en.yaml", "en")
+    write(tmp_path / "apps" / "translations" / "en.yaml", "en")
+    write(tmp_path / "apps" / "translations" / "old" / "nl.yaml", "nl")
+    write(tmp_path / "apps" / "icon.png", "png")
+
+    changes = sync(str(tmp_path / "source"), str(tmp_path / "apps"), "translations")
+    assert changes == {"translations/old/nl.yaml"}
+    assert os.listdir(tmp_path / "apps" / "translations") == ["en.yaml"]
+
+    assert sync(str(tmp_path / "source"), str(tmp_path / "apps"), "icon.png") == {
+        "icon.png"
+    }
+    assert not os.path.exists(tmp_path / "apps" / "icon.png")
@@ -0,0 +1,77 @@
+"""Tests for the shared, caching template engine."""
+
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+from jinja2 import TemplateNotFound
+
+from repositoryupdater.templates import TemplateEngine
+
+
+def write(path: str, content: str):
+    """Write a file."""
+    with open(path, "w", encoding="utf8") as f:
+        f.write(content)
+
+
+def read(path: str) -> str:
+    """Read a file."""
+    with open(path, encoding="utf8") as f:
+        return f.read()
+
+
+def test_loads_sibling_templates(tmp_path):
+    """Templates include, extend and import templates next to them."""
+    write(tmp_path / "apps.j2", "{% for app in apps %}- {{ app }}\n{% endfor %}")
+    write(tmp_path / "base.j2", "# Apps\n{% block body %}{% endblock %}")
+    write(tmp_path / "macros.j2", "{% macro bold(text) %}**{{ text }}**{% endmacro %}")
+    source = (
+        '{% extends "base.j2" %}{% import "macros.j2" as m %}'
+        '{% block body %}{{ m.bold("All") }}\n{% include "apps.j2" %}{% endblock %}'
+    )
+    engine = TemplateEngine()
+    output = engine.render(source, {"apps": ["a", "b"]}, str(tmp_path))
+    assert output == "# Apps\n**All**\n- a\n- b\n"
+
+
+def test_unknown_template(tmp_path):
+    """Templates that exist nowhere are reported as not found."""
+    engine = TemplateEngine()
+    with pytest.raises(TemplateNotFound):
+        engine.render('{% include "missing.j2" %}', {}, str(tmp_path))
+    with pytest.raises(TemplateNotFound):
+        engine.jinja.get_template("missing")
+
+
+def test_renders_again_when_sibling_changes(tmp_path):
+    """Renders are skipped, unless a template they include changed."""
+    output = str(tmp_path / "README.md")
+    write(tmp_path / "apps.j2", "one")
+    engine = TemplateEngine(str(tmp_path / "cache"))
+    source = '{% include "apps.j2" %}'
+
+    assert engine.render_file("README.md", source, {}, output, str(tmp_path))
+    assert not engine.render_file("README.md", source, {}, output, str(tmp_path))
+    write(tmp_path / "apps.j2", "two")
+    os.utime(tmp_path / "apps.j2", (0, 0))
+    assert engine.render_file("README.md", source, {}, output, str(tmp_path))
+    assert read(output) == "two"
+
+
+def test_saves_renders_once(tmp_path):
+    """Renders are only written to disk when saved."""
+    cache = str(tmp_path / "cache")
+    output = str(tmp_path / "README.md")
+    engine = TemplateEngine(cache)
+    assert engine.render_file("README.md", "{{ name }}", {"name": "a"}, output)
+    assert not os.path.exists(engine.renders_file)
+
+    engine.save()
+    with open(engine.renders_file, encoding="utf8") as f:
+        assert list(json.load(f)) == ["README.md"]
+    assert not TemplateEngine(cache).render_file(
+        "README.md", "{{ name }}", {"name": "a"}, output
+    )